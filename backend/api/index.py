@@ -1,10 +1,13 @@
 """Main FastAPI application."""
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from datetime import timedelta
 
-from fastapi import FastAPI, Depends, HTTPException, status
+import anyio
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -13,21 +16,49 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app.config import get_settings
-from app.database import get_db, sessionmanager
-from app.dependencies import get_current_user
+from app.database import get_db, get_read_db, sessionmanager
+from app.dependencies import get_current_admin, get_current_user
 from app.middleware import LoggingMiddleware
-from app.models.db_models import User
 from app.models.schemas import *
-from app.services.auth_service import AuthService
+from app.services.auth_service import (
+    AuthService, PasswordHasherBusy, close_password_hasher, get_password_hasher, get_principal_cache
+)
 from app.services.learning_service import LearningService
+from app.services.context_service import ContextService
+from app.services.grading_service import GradingService
+from app.services.problem_bank_service import ProblemBankService
+from app.services.recommendation_service import RecommendationService
+from app.services.usage_service import UsageService
+from app.services.user_import_service import UserImportService, close_hash_pool
+from app.services.user_service import UserService
 from app.agents.tutor_agent import get_tutor_agent
 from app.agents.problem_generator import get_problem_generator
+from app.agents.problem_pool import get_problem_pool
+from app.agents.structured_output import StructuredOutputError
+from app.llm.client import close_llm_client, get_llm_client
+from app.llm.resilience import LLMUnavailable
+from app.llm.scheduler import RateLimitExceeded
+from app.llm.usage import QuotaExceeded
+from app.utils import format_sse, truncate_to_tokens
 
 # Setup
 settings = get_settings()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SUGGESTED_TOPICS = [
+    "Python Programming",
+    "Data Structures",
+    "Algorithms",
+    "Web Development",
+    "Machine Learning",
+    "Database Design",
+    "System Design",
+    "Mathematics",
+    "Statistics",
+    "Computer Networks"
+]
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan."""
@@ -37,14 +68,23 @@ async def lifespan(app: FastAPI):
     sessionmanager.init()
     await sessionmanager.create_all()
     
-    # Initialize agents
+    # Initialize agents and the shared LLM provider
     get_tutor_agent()
     get_problem_generator()
+    await get_llm_client().start()
+    
+    # Start pre-generating practice problems
+    if settings.problem_pool_enabled:
+        await get_problem_pool().start(SUGGESTED_TOPICS)
     
     logger.info("Application ready")
     
     yield
     
+    await get_problem_pool().stop()
+    await close_llm_client()
+    close_password_hasher()
+    close_hash_pool()
     await sessionmanager.close()
     logger.info("Application shutdown")
 
@@ -63,8 +103,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    """Reject requests from users over their LLM call allowance."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many AI requests, please slow down"},
+        headers={"Retry-After": str(int(exc.retry_after))}
+    )
+
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded_handler(request: Request, exc: QuotaExceeded):
+    """Reject LLM requests from users who used up today's token quota."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Daily AI usage limit reached, please try again tomorrow"},
+        headers={"Retry-After": str(int(exc.retry_after))}
+    )
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    """Turn sign-ins away quickly while the password hasher is saturated."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-ins right now, please try again in a moment"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailable):
+    """Fail fast while the AI service is slow or down."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The AI service is temporarily unavailable, please try again shortly"},
+        headers={"Retry-After": str(int(settings.llm_breaker_cooldown_seconds))}
+    )
+
 # Auth endpoints
 
 @app.post("/api/auth/register", response_model=Token, status_code=201)
@@ -100,37 +177,71 @@ async def login(
     }
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     """Get current user."""
     return UserResponse.model_validate(current_user)
 
 @app.put("/api/auth/profile", response_model=UserResponse)
 async def update_profile(
     update_data: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Update user profile."""
-    if update_data.full_name:
-        current_user.full_name = update_data.full_name
-    if update_data.email:
-        current_user.email = update_data.email
-    if update_data.learning_goals:
-        current_user.learning_goals = update_data.learning_goals
-    if update_data.preferred_topics:
-        current_user.preferred_topics = update_data.preferred_topics
-    
-    await db.commit()
-    await db.refresh(current_user)
+    user = await UserService.get_user_by_id(db, current_user.id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid user")
     
-    return UserResponse.model_validate(current_user)
+    user = await UserService.update_user(db, user, update_data)
+    return UserResponse.model_validate(user)
+
+# Admin endpoints
+
+@app.post("/api/admin/users/import")
+async def import_users(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults from the Content-Type"),
+    admin: Principal = Depends(get_current_admin)
+):
+    """Create users in bulk from a CSV or NDJSON upload.
+    
+    Rows have the registration fields. The report is streamed as NDJSON:
+    one result per row, in order, then a summary line.
+    """
+    if format is None:
+        format = "ndjson" if "json" in request.headers.get("content-type", "") else "csv"
+    
+    # Receive the whole upload before streaming the report back
+    upload = await UserImportService.spool(request.stream())
+    return StreamingResponse(
+        UserImportService.import_users(upload, format, admin.username),
+        media_type="application/x-ndjson"
+    )
+
+@app.put("/api/admin/users/{username}/active", response_model=UserResponse)
+async def set_user_active(
+    username: str,
+    update_data: UserActiveUpdate,
+    admin: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Activate or deactivate a user; a deactivated user's tokens stop working at once."""
+    if username == admin.username and not update_data.is_active:
+        raise HTTPException(status_code=400, detail="Admins cannot deactivate themselves")
+    
+    user = await AuthService.get_user_by_username(db, username)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user = await UserService.set_active(db, user, update_data.is_active)
+    return UserResponse.model_validate(user)
 
 # Conversation endpoints
 
 @app.post("/api/conversations", response_model=ConversationResponse)
 async def create_conversation(
     conv_data: ConversationCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Create new conversation."""
@@ -146,47 +257,65 @@ async def create_conversation(
 
 @app.get("/api/conversations", response_model=List[ConversationResponse])
 async def get_conversations(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get user conversations."""
-    convs = await LearningService.get_user_conversations(db, current_user.id)
-    
-    return [
-        ConversationResponse(
-            id=c.id,
-            title=c.title,
-            topic=c.topic,
-            created_at=c.created_at,
-            message_count=len(c.messages) if hasattr(c, 'messages') else 0
+    """Get user conversations, newest first.
+    
+    When more conversations exist, the X-Next-Cursor response header holds
+    the cursor for the next page.
+    """
+    try:
+        convs, next_cursor = await LearningService.get_user_conversations(
+            db, current_user.id, limit=limit, cursor=cursor
         )
-        for c in convs
-    ]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return [ConversationResponse(**c) for c in convs]
 
 @app.get("/api/conversations/{conv_id}", response_model=ConversationDetailResponse)
 async def get_conversation(
     conv_id: int,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get conversation with messages."""
-    conv = await LearningService.get_conversation_with_messages(db, conv_id, current_user.id)
+    """Get conversation with a page of messages.
+    
+    Returns the newest messages by default; pass before_id to load older
+    history or after_id to load messages newer than the given one.
+    """
+    conv = await LearningService.get_conversation(db, conv_id, current_user.id)
     
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
+    messages, has_more = await LearningService.get_messages_page(
+        db, conv_id, limit=limit, before_id=before_id, after_id=after_id
+    )
+    
     return ConversationDetailResponse(
         id=conv.id,
         title=conv.title,
         topic=conv.topic,
         created_at=conv.created_at,
-        messages=[MessageResponse.model_validate(m) for m in conv.messages]
+        messages=[MessageResponse.model_validate(m) for m in messages],
+        has_more=has_more
     )
 
 @app.delete("/api/conversations/{conv_id}", status_code=204)
 async def delete_conversation(
     conv_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete a conversation."""
@@ -201,38 +330,117 @@ async def delete_conversation(
 async def send_message(
     conv_id: int,
     msg_data: MessageCreate,
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Send message in conversation."""
-    # Verify conversation belongs to user
-    conv = await LearningService.get_conversation_with_messages(db, conv_id, current_user.id)
+    # Verify conversation belongs to user; its history is not loaded
+    conv = await LearningService.get_conversation(db, conv_id, current_user.id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # Save user message
-    user_msg = await LearningService.add_message(db, conv_id, "user", msg_data.content)
+    # Build budgeted history before the new message is stored
+    history, needs_summary = await ContextService.build_context(db, conv)
     
-    # Get AI response
+    # Start the AI response while the user message is saved
     agent = get_tutor_agent()
-    ai_response = await agent.chat(msg_data.content)
+    reply = asyncio.create_task(agent.chat(msg_data.content, history=history))
+    try:
+        await LearningService.add_message(db, conv_id, "user", msg_data.content)
+    except BaseException:
+        reply.cancel()
+        raise
+    ai_response = await reply
     
     # Save AI message
-    ai_msg = await LearningService.add_message(db, conv_id, "assistant", ai_response)
+    ai_msg = await LearningService.add_reply(db, conv_id, ai_response)
+    
+    if needs_summary:
+        background_tasks.add_task(ContextService.refresh_summary, conv_id)
     
     return MessageResponse.model_validate(ai_msg)
 
+@app.post("/api/conversations/{conv_id}/messages/stream")
+async def stream_message(
+    conv_id: int,
+    msg_data: MessageCreate,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Send message and stream the AI response as Server-Sent Events."""
+    # Verify conversation belongs to user; its history is not loaded
+    conv = await LearningService.get_conversation(db, conv_id, current_user.id)
+    if not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Build budgeted history before the new message is stored
+    history, needs_summary = await ContextService.build_context(db, conv)
+    if needs_summary:
+        background_tasks.add_task(ContextService.refresh_summary, conv_id)
+    
+    # Save user message
+    user_msg = await LearningService.add_message(db, conv_id, "user", msg_data.content)
+    user_event = MessageResponse.model_validate(user_msg).model_dump(mode="json")
+    
+    agent = get_tutor_agent()
+    
+    async def event_stream():
+        parts = []
+        ai_msg = None
+        yield format_sse("user_message", user_event)
+        try:
+            async for delta in agent.stream_chat(msg_data.content, history=history):
+                parts.append(delta)
+                yield format_sse("delta", {"content": delta})
+        except QuotaExceeded as e:
+            yield format_sse("error", {"detail": "Daily AI usage limit reached, please try again tomorrow", "retry_after": e.retry_after})
+        except RateLimitExceeded as e:
+            yield format_sse("error", {"detail": "Too many AI requests, please slow down", "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Streaming chat error: {e}")
+            yield format_sse("error", {"detail": "The tutor stopped responding"})
+        finally:
+            # Persist whatever was generated, even if the client disconnected
+            # mid-stream; shielded so the cancellation does not abort the write.
+            content = "".join(parts)
+            if content:
+                with anyio.CancelScope(shield=True):
+                    async with sessionmanager.session() as persist_db:
+                        ai_msg = await LearningService.add_reply(persist_db, conv_id, content)
+        
+        if ai_msg:
+            yield format_sse("done", MessageResponse.model_validate(ai_msg).model_dump(mode="json"))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Practice endpoints
 
 @app.post("/api/practice/generate", response_model=dict)
 async def generate_problem(
     request: ProblemGenerateRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Generate practice problem."""
-    agent = get_problem_generator()
-    problem = await agent.generate(request.topic, request.difficulty)
+    # Reuse a banked problem this user has not attempted yet, pooled ones included
+    problem = await ProblemBankService.select_unseen(
+        db, current_user.id, request.topic, request.difficulty
+    )
+    
+    if problem is None:
+        # The pool keeps the bank stocked; generate inline when it has run dry
+        agent = get_problem_generator()
+        try:
+            generated = await agent.generate(request.topic, request.difficulty)
+        except StructuredOutputError:
+            raise HTTPException(status_code=502, detail="Could not generate problem")
+        problem = await ProblemBankService.add_problem(db, request.topic, request.difficulty, generated)
     
     # Save session
     session = await LearningService.create_practice_session(
@@ -242,8 +450,10 @@ async def generate_problem(
         request.difficulty,
         problem.problem_text,
         problem.hints,
-        problem.solution
+        problem.solution,
+        problem_id=problem.id
     )
+    get_problem_pool().record_use(request.topic, request.difficulty)
     
     return {
         "session_id": session.id,
@@ -255,32 +465,76 @@ async def generate_problem(
         }
     }
 
+@app.post("/api/practice/generate-batch", response_model=dict)
+async def generate_problem_batch(
+    request: ProblemBatchGenerateRequest,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Generate a set of practice problems with at most one LLM call."""
+    problems = await ProblemBankService.select_unseen_many(
+        db, current_user.id, request.topic, request.difficulty, request.count
+    )
+    
+    missing = request.count - len(problems)
+    if missing > 0:
+        agent = get_problem_generator()
+        try:
+            generated = await agent.generate_batch(request.topic, request.difficulty, missing)
+        except StructuredOutputError:
+            generated = []
+        
+        seen_ids = {p.id for p in problems}
+        for item in generated:
+            banked = await ProblemBankService.add_problem(db, request.topic, request.difficulty, item)
+            if banked.id not in seen_ids:
+                seen_ids.add(banked.id)
+                problems.append(banked)
+    
+    if not problems:
+        raise HTTPException(status_code=502, detail="Could not generate problems")
+    
+    # Save all sessions in one transaction
+    sessions = await LearningService.create_practice_sessions(
+        db,
+        current_user.id,
+        request.topic,
+        request.difficulty,
+        problems
+    )
+    get_problem_pool().record_use(request.topic, request.difficulty, len(sessions))
+    
+    return {
+        "problems": [
+            {
+                "session_id": session.id,
+                "problem": {
+                    "problem_text": session.problem_text,
+                    "hints": session.hints,
+                    "difficulty": request.difficulty,
+                    "topic": request.topic
+                }
+            }
+            for session in sessions
+        ]
+    }
+
 @app.post("/api/practice/submit", response_model=dict)
 async def submit_answer(
     request: SubmitAnswerRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Submit practice answer."""
-    # Get tutor agent to evaluate
-    agent = get_tutor_agent()
-    
-    # Simple evaluation (you can make this more sophisticated)
-    feedback_prompt = f"""Evaluate this student answer and provide feedback.
-
-Problem context available in session.
-Student answer: {request.answer}
-
-Provide:
-1. Is it correct? (yes/no)
-2. Score out of 100
-3. Constructive feedback"""
-    
-    feedback_text = await agent.chat(feedback_prompt)
+    session = await LearningService.get_practice_session(db, request.session_id, current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Practice session not found")
     
-    # Parse feedback (simplified - in production use structured output)
-    is_correct = "yes" in feedback_text.lower()[:100]
-    score = 85.0 if is_correct else 40.0
+    # Deterministic checks against the stored solution first, LLM if inconclusive
+    try:
+        result = await GradingService.grade(session, request.answer)
+    except StructuredOutputError:
+        raise HTTPException(status_code=502, detail="Could not grade answer")
     
     # Update session
     await LearningService.submit_practice_answer(
@@ -288,21 +542,21 @@ Provide:
         request.session_id,
         current_user.id,
         request.answer,
-        is_correct,
-        score,
-        feedback_text
+        result.is_correct,
+        result.score,
+        result.feedback
     )
     
     return {
-        "is_correct": is_correct,
-        "score": score,
-        "feedback": feedback_text
+        "is_correct": result.is_correct,
+        "score": result.score,
+        "feedback": result.feedback
     }
 
 @app.get("/api/practice/history", response_model=List[PracticeSessionResponse])
 async def get_practice_history(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get practice history."""
     from sqlalchemy import select, desc
@@ -323,13 +577,22 @@ async def get_practice_history(
 
 @app.get("/api/stats", response_model=LearningStats)
 async def get_stats(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get learning statistics."""
     stats = await LearningService.get_user_stats(db, current_user.id)
     return LearningStats(**stats)
 
+@app.get("/api/usage", response_model=UsageResponse)
+async def get_usage(
+    days: int = Query(7, ge=1, le=90),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get AI token usage per day and feature, and the remaining daily quota."""
+    return await UsageService.get_usage(db, current_user.id, days)
+
 # Utility endpoints
 
 @app.get("/", response_model=HealthCheck)
@@ -340,25 +603,22 @@ async def health():
         service=settings.app_name,
         version=settings.app_version,
         database=True,
-        ai_service=True
+        ai_service=get_llm_client().breaker.state != "open"
     )
 
 @app.get("/api/topics")
 async def get_topics():
     """Get suggested topics."""
+    return {"topics": SUGGESTED_TOPICS}
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Get LLM, password hasher, auth cache and problem pool counters."""
     return {
-        "topics": [
-            "Python Programming",
-            "Data Structures",
-            "Algorithms",
-            "Web Development",
-            "Machine Learning",
-            "Database Design",
-            "System Design",
-            "Mathematics",
-            "Statistics",
-            "Computer Networks"
-        ]
+        "llm": get_llm_client().stats(),
+        "password_hasher": get_password_hasher().stats(),
+        "auth_cache": get_principal_cache().stats(),
+        "problem_pool": get_problem_pool().depth()
     }
 
 # ============================================================================
@@ -368,7 +628,8 @@ async def get_topics():
 @app.post("/api/agent/recommendation", response_model=AgentRecommendationResponse)
 async def get_agent_recommendation(
     request: AgentRecommendationRequest,
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get AI agent recommendation based on user context."""
@@ -376,61 +637,23 @@ async def get_agent_recommendation(
         # Get user stats
         stats = await LearningService.get_user_stats(db, current_user.id)
         
-        # Build context for AI
-        context = f"""
-User: {current_user.full_name}
-Current page: {request.current_route}
-Learning goals: {current_user.learning_goals or 'Not set'}
-Total conversations: {stats['total_conversations']}
-Practice sessions: {stats['total_practice_sessions']}
-Completed sessions: {stats['practice_sessions_completed']}
-Average score: {stats['average_score']:.1f}%
-Topics practiced: {', '.join(stats['topics_practiced'][:5]) if stats['topics_practiced'] else 'None yet'}
-"""
-        
-        # Get recommendation from tutor agent
-        tutor = get_tutor_agent()
-        prompt = f"""Based on this user's learning context, provide a brief, helpful recommendation.
-
-{context}
-
-Respond in this exact JSON format:
-{{
-    "quick_tip": "A short motivational tip (1 sentence)",
-    "suggestion": "What the user should do next (2-3 sentences max)",
-    "estimated_time": "Time estimate like '5 min' or '15 min'",
-    "priority": "low" or "medium" or "high",
-    "action_type": "practice" or "review" or "learn" or "break"
-}}
-
-Be encouraging and specific. If they're new, suggest starting with basics. If they've been practicing a lot, maybe suggest a break or review."""
-
-        response = await tutor.get_response(prompt, [])
-        
-        # Parse JSON from response
-        import json
-        import re
-        
-        # Try to extract JSON from response
-        json_match = re.search(r'\{[^{}]*\}', response, re.DOTALL)
-        if json_match:
-            rec_data = json.loads(json_match.group())
-        else:
-            # Default response if parsing fails
-            rec_data = {
-                "quick_tip": "Keep up the great work! Consistency is key to learning.",
-                "suggestion": "Try practicing a new topic or review your recent sessions to reinforce your learning.",
-                "estimated_time": "10 min",
-                "priority": "medium",
-                "action_type": "practice"
-            }
+        # Rule-based or cached LLM recommendation; the LLM only runs, in the
+        # background, when the user's stats have changed meaningfully
+        rec_data, needs_refresh = RecommendationService.recommend(
+            current_user.id, request.current_route, stats
+        )
+        if needs_refresh:
+            background_tasks.add_task(
+                RecommendationService.refresh_llm_recommendation,
+                current_user.id,
+                request.current_route,
+                stats,
+                current_user.full_name,
+                current_user.learning_goals
+            )
         
         return AgentRecommendationResponse(
-            quick_tip=rec_data.get("quick_tip", "Keep learning!"),
-            suggestion=rec_data.get("suggestion", "Try a practice session."),
-            estimated_time=rec_data.get("estimated_time", "10 min"),
-            priority=rec_data.get("priority", "medium"),
-            action_type=rec_data.get("action_type", "practice"),
+            **rec_data,
             stats=AgentStatsResponse(
                 total_conversations=stats['total_conversations'],
                 total_practice_sessions=stats['total_practice_sessions'],
@@ -454,7 +677,7 @@ Be encouraging and specific. If they're new, suggest starting with basics. If th
 @app.post("/api/agent/chat", response_model=AgentChatResponse)
 async def agent_chat(
     request: AgentChatRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Chat with AI agent."""
@@ -466,8 +689,8 @@ async def agent_chat(
         system_context = f"""You are a helpful AI learning assistant for {current_user.full_name}.
 
 User's learning profile:
-- Learning goals: {current_user.learning_goals or 'Not specified'}
-- Topics practiced: {', '.join(stats['topics_practiced'][:5]) if stats['topics_practiced'] else 'None yet'}
+- Learning goals: {truncate_to_tokens(current_user.learning_goals, settings.prompt_field_max_tokens) or 'Not specified'}
+- Topics practiced: {truncate_to_tokens(', '.join(stats['topics_practiced'][:5]), settings.prompt_field_max_tokens) or 'None yet'}
 - Practice sessions: {stats['total_practice_sessions']} ({stats['practice_sessions_completed']} completed)
 - Average score: {stats['average_score']:.1f}%
 
@@ -499,6 +722,8 @@ Format responses in markdown when helpful."""
             message=response,
             suggestions=suggestions if suggestions else None
         )
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         logger.error(f"Agent chat error: {e}")
         return AgentChatResponse(
@@ -1,20 +1,16 @@
 """Problem Generator Agent using OpenAI ChatGPT."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
-import json
-import re
-from openai import AsyncOpenAI
 
 from ..config import get_settings
+from ..llm.routing import route
+from ..llm.scheduler import Priority
+from .structured_output import StructuredOutputError, complete_structured, get_adapter
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Initialize OpenAI client
-client = AsyncOpenAI(api_key=settings.openai_api_key)
-
 class GeneratedProblem(BaseModel):
     """Generated problem structure."""
     problem_text: str
@@ -22,13 +18,18 @@ class GeneratedProblem(BaseModel):
     solution: str
     explanation: str
 
+class GeneratedProblemSet(BaseModel):
+    """Generated problem set structure; items are validated one by one."""
+    # Requested with the GeneratedProblem schema, accepted as plain objects
+    problems: List[dict] = Field(json_schema_extra={"items": GeneratedProblem.model_json_schema()})
+
 class ProblemGeneratorAgent:
     """Problem Generator Agent using ChatGPT."""
     
     def __init__(self):
-        self.model = settings.openai_model
         self.system_prompt = self._get_system_prompt()
-        logger.info(f"ProblemGeneratorAgent initialized with model: {self.model}")
+        self.batch_system_prompt = self._get_batch_system_prompt()
+        logger.info(f"ProblemGeneratorAgent initialized with model: {route('problem_generation')['model']}")
     
     @staticmethod
     def _get_system_prompt() -> str:
@@ -53,75 +54,106 @@ Guidelines:
 
 RESPOND WITH ONLY JSON, NO OTHER TEXT."""
     
-    def _parse_response(self, response: str) -> GeneratedProblem:
-        """Parse the text response into GeneratedProblem."""
-        try:
-            # Try to find JSON in the response
-            json_match = re.search(r'\{[\s\S]*\}', response)
-            if json_match:
-                data = json.loads(json_match.group())
-                return GeneratedProblem(**data)
-        except (json.JSONDecodeError, Exception) as e:
-            logger.warning(f"Failed to parse JSON: {e}")
-        
-        # Fallback: create from text sections
-        lines = response.strip().split('\n')
-        problem_text = ""
-        hints = []
-        solution = ""
-        explanation = ""
-        
-        current_section = None
-        for line in lines:
-            line_lower = line.lower().strip()
-            if 'problem' in line_lower and ':' in line:
-                current_section = 'problem'
-                problem_text = line.split(':', 1)[-1].strip()
-            elif 'hint' in line_lower:
-                current_section = 'hints'
-                hint_text = line.split(':', 1)[-1].strip() if ':' in line else line.strip()
-                if hint_text:
-                    hints.append(hint_text)
-            elif 'solution' in line_lower and ':' in line:
-                current_section = 'solution'
-                solution = line.split(':', 1)[-1].strip()
-            elif 'explanation' in line_lower and ':' in line:
-                current_section = 'explanation'
-                explanation = line.split(':', 1)[-1].strip()
-            elif current_section:
-                if current_section == 'problem':
-                    problem_text += ' ' + line.strip()
-                elif current_section == 'solution':
-                    solution += ' ' + line.strip()
-                elif current_section == 'explanation':
-                    explanation += ' ' + line.strip()
-        
-        return GeneratedProblem(
-            problem_text=problem_text or response[:200],
-            hints=hints or ["Think about the basics", "Try breaking it down"],
-            solution=solution or "See explanation",
-            explanation=explanation or response
-        )
+    @staticmethod
+    def _get_batch_system_prompt() -> str:
+        return """You are an expert at creating educational practice problems.
+
+Your task is to generate sets of distinct practice problems in JSON format.
+
+IMPORTANT: Your response must be ONLY valid JSON with this exact structure:
+{
+    "problems": [
+        {
+            "problem_text": "Clear problem statement here",
+            "hints": ["Hint 1", "Hint 2", "Hint 3"],
+            "solution": "Complete correct solution",
+            "explanation": "Why this solution works"
+        }
+    ]
+}
+
+Guidelines:
+- Every problem in the set must be different
+- Match difficulty level requested (easy/medium/hard)
+- Provide 2-3 progressive hints per problem
+- Include complete solution with explanation
+
+RESPOND WITH ONLY JSON, NO OTHER TEXT."""
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=2, max=30))
-    async def generate(self, topic: str, difficulty: str) -> GeneratedProblem:
+    async def generate(
+        self,
+        topic: str,
+        difficulty: str,
+        priority: Priority = Priority.GENERATION
+    ) -> GeneratedProblem:
         """Generate practice problem using ChatGPT."""
         prompt = f"""Generate a {difficulty} difficulty practice problem about: {topic}
 
 The problem should be appropriate for a student learning this topic.
 Return ONLY a JSON object with: problem_text, hints (array), solution, explanation"""
         
-        response = await client.chat.completions.create(
-            model=self.model,
-            messages=[
+        return await complete_structured(
+            GeneratedProblem,
+            "practice_problem",
+            [
                 {"role": "system", "content": self.system_prompt},
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=1000,
-            temperature=0.7
+            priority=priority,
+            use_cache=False,
+            **route("problem_generation")
         )
+    
+    async def generate_batch(self, topic: str, difficulty: str, n: int) -> List[GeneratedProblem]:
+        """Generate several practice problems in a single completion."""
+        prompt = f"""Generate {n} distinct {difficulty} difficulty practice problems about: {topic}
+
+The problems should be appropriate for a student learning this topic.
+Return ONLY a JSON object whose "problems" array holds {n} objects, each with: problem_text, hints (array), solution, explanation"""
+        
+        # The route's output limit is per problem
+        params = route("problem_generation")
+        params["max_tokens"] = min(params["max_tokens"] * n, 8000)
+        params["temperature"] = max(params["temperature"], 0.8)  # Keeps the set varied
+        
+        # Malformed items are dropped; a repair is only requested when too few are left
+        usable: List[GeneratedProblem] = []
+        
+        def check(problem_set: GeneratedProblemSet) -> GeneratedProblemSet:
+            adapter = get_adapter(GeneratedProblem)
+            problems, errors = [], []
+            for item in problem_set.problems:
+                try:
+                    problems.append(adapter.validate_python(item))
+                except ValidationError as e:
+                    errors.append(e.errors(include_url=False, include_input=False)[:3])
+            if len(problems) > len(usable):
+                usable[:] = problems
+            if len(problems) < n:
+                raise StructuredOutputError(
+                    f"Only {len(problems)} of {n} problems are valid: {errors[:3] or 'too few problems'}"
+                )
+            return problem_set
+        
+        try:
+            await complete_structured(
+                GeneratedProblemSet,
+                "practice_problem_set",
+                [
+                    {"role": "system", "content": self.batch_system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                check=check,
+                priority=Priority.GENERATION,
+                use_cache=False,
+                **params
+            )
+        except StructuredOutputError:
+            if not usable:
+                raise
+            logger.warning(f"Batch for {topic}/{difficulty} returned {len(usable)} of {n} usable problems")
         
-        return self._parse_response(response.choices[0].message.content)
+        return usable[:n]
 
 _problem_agent: Optional[ProblemGeneratorAgent] = None
 
@@ -0,0 +1,164 @@
+"""Pre-generated practice problem pool."""
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+from ..config import get_settings
+from ..database import sessionmanager
+from ..llm.scheduler import Priority
+from ..services.problem_bank_service import ProblemBankService
+from ..utils import normalize_topic
+from .problem_generator import get_problem_generator
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+DIFFICULTIES = ("easy", "medium", "hard")
+FAILURE_BACKOFF_SECONDS = 60
+MAX_TRACKED_DEMAND = 1000
+
+PoolKey = Tuple[str, str]
+
+
+class ProblemPool:
+    """Stock of banked problems nobody has attempted, per (topic, difficulty).
+
+    Suggested topics and the most requested user topics are kept above a
+    low watermark by background workers. The stock lives in the problem
+    bank, so problems left over from before a restart count towards it and
+    only the shortfall is generated. Generate requests pick it up through
+    the bank's unseen lookup, mostly without waiting on the LLM.
+    """
+
+    def __init__(
+        self,
+        size: int = 3,
+        low_watermark: int = 1,
+        workers: int = 2,
+        trending_limit: int = 10
+    ):
+        self.size = size
+        self.low_watermark = low_watermark
+        self.worker_count = workers
+        self.trending_limit = trending_limit
+
+        self._depth: Dict[PoolKey, int] = {}
+        self._topics: Dict[PoolKey, str] = {}
+        self._suggested: Set[PoolKey] = set()
+        self._demand: Counter = Counter()
+        self._retry_after: Dict[PoolKey, float] = {}
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[PoolKey] = set()
+        self._workers: List[asyncio.Task] = []
+
+    @staticmethod
+    def key(topic: str, difficulty: str) -> PoolKey:
+        return (normalize_topic(topic), difficulty)
+
+    async def start(self, topics: List[str]) -> None:
+        """Start refill workers and warm the pools for the suggested topics."""
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"problem-pool-{i}")
+            for i in range(self.worker_count)
+        ]
+
+        for topic in topics:
+            for difficulty in DIFFICULTIES:
+                key = self.key(topic, difficulty)
+                self._topics.setdefault(key, topic)
+                self._suggested.add(key)
+                self._schedule(key)
+
+        logger.info(f"Problem pool started with {self.worker_count} workers")
+
+    async def stop(self) -> None:
+        """Stop refill workers."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._queued.clear()
+
+    def record_use(self, topic: str, difficulty: str, count: int = 1) -> None:
+        """Note that problems were served, refilling the pool if it runs low."""
+        key = self.key(topic, difficulty)
+        self._topics.setdefault(key, topic)
+        self._record_demand(key)
+
+        # Served problems may come from older bank entries; workers recount
+        depth = max(self._depth.get(key, 0) - count, 0)
+        self._depth[key] = depth
+
+        if self._is_tracked(key) and depth < self.low_watermark:
+            self._schedule(key)
+
+    def depth(self) -> Dict[str, int]:
+        """Unattempted problems per pool as last counted, for monitoring."""
+        return {f"{topic}/{difficulty}": depth for (topic, difficulty), depth in self._depth.items()}
+
+    def _record_demand(self, key: PoolKey) -> None:
+        self._demand[key] += 1
+        if len(self._demand) > MAX_TRACKED_DEMAND:
+            self._demand = Counter(dict(self._demand.most_common(MAX_TRACKED_DEMAND // 2)))
+
+    def _is_tracked(self, key: PoolKey) -> bool:
+        """Whether a pool is kept warm: suggested topics plus trending ones."""
+        if key in self._suggested:
+            return True
+        return key in {k for k, _ in self._demand.most_common(self.trending_limit)}
+
+    def _schedule(self, key: PoolKey) -> None:
+        """Queue a pool for refilling unless it is already queued or backing off."""
+        if self._queue is None or key in self._queued:
+            return
+        if self._retry_after.get(key, 0) > time.monotonic():
+            return
+        self._queued.add(key)
+        self._queue.put_nowait(key)
+
+    async def _worker(self) -> None:
+        generator = get_problem_generator()
+        while True:
+            key = await self._queue.get()
+            topic, difficulty = self._topics.get(key, key[0]), key[1]
+            try:
+                async with sessionmanager.read_session() as db:
+                    depth = await ProblemBankService.count_unattempted(db, topic, difficulty)
+
+                # Generate the shortfall once; duplicates of banked problems are not retried
+                for _ in range(self.size - depth):
+                    problem = await generator.generate(topic, difficulty, Priority.BACKGROUND)
+                    async with sessionmanager.session() as db:
+                        await ProblemBankService.add_problem(db, topic, difficulty, problem)
+                        await db.commit()
+                        depth = await ProblemBankService.count_unattempted(db, topic, difficulty)
+
+                self._depth[key] = depth
+                self._retry_after.pop(key, None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Problem pool refill failed for {topic}/{difficulty}: {e}")
+                self._retry_after[key] = time.monotonic() + FAILURE_BACKOFF_SECONDS
+            finally:
+                self._queued.discard(key)
+
+
+_problem_pool: Optional[ProblemPool] = None
+
+
+def get_problem_pool() -> ProblemPool:
+    global _problem_pool
+    if _problem_pool is None:
+        _problem_pool = ProblemPool(
+            size=settings.problem_pool_size,
+            low_watermark=settings.problem_pool_low_watermark,
+            workers=settings.problem_pool_workers,
+            trending_limit=settings.problem_pool_trending_topics
+        )
+    return _problem_pool
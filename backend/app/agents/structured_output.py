@@ -0,0 +1,141 @@
+"""Schema-constrained JSON output for the agents."""
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Type, TypeVar
+import logging
+import re
+
+from pydantic import TypeAdapter, ValidationError
+
+from ..config import get_settings
+from ..llm.client import get_llm_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+T = TypeVar("T")
+
+FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+
+REPAIR_PROMPT = """Your previous reply could not be parsed: {error}
+
+Reply again with ONLY the corrected JSON, matching the requested structure exactly."""
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a completion cannot be parsed into the expected type."""
+
+    def __init__(self, message: str, content: str = ""):
+        super().__init__(message)
+        self.content = content
+
+
+@lru_cache(maxsize=None)
+def get_adapter(output_type: Type[T]) -> TypeAdapter:
+    """Get the compiled validator for a type, building it once."""
+    return TypeAdapter(output_type)
+
+
+@lru_cache(maxsize=None)
+def response_format(output_type: Type[Any], name: str) -> dict:
+    """Build the response_format request parameter for the configured mode."""
+    if settings.structured_output_mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": name,
+                "schema": get_adapter(output_type).json_schema()
+            }
+        }
+    return {"type": "json_object"}
+
+
+def parse(text: str, output_type: Type[T]) -> T:
+    """Parse and validate a JSON reply in a single pass.
+
+    Schema-constrained replies are validated directly from the raw text;
+    code fences or prose around the JSON are only stripped if that fails.
+    """
+    adapter = get_adapter(output_type)
+    try:
+        return adapter.validate_json(text)
+    except ValidationError as e:
+        error = e
+
+    stripped = FENCE_RE.sub('', text or '')
+    starts = [i for i in (stripped.find('{'), stripped.find('[')) if i != -1]
+    if starts:
+        start = min(starts)
+        end = stripped.rfind('}' if stripped[start] == '{' else ']')
+        if end > start:
+            try:
+                return adapter.validate_json(stripped[start:end + 1])
+            except ValidationError as e:
+                error = e
+
+    raise StructuredOutputError(
+        f"Invalid {getattr(output_type, '__name__', 'JSON')} output: "
+        f"{error.errors(include_url=False, include_input=False)[:3]}",
+        content=text
+    )
+
+
+async def complete_structured(
+    output_type: Type[T],
+    name: str,
+    messages: list,
+    check: Optional[Callable[[T], T]] = None,
+    **kwargs
+) -> T:
+    """Request a completion as JSON and parse it into output_type.
+
+    check can refine the parsed value, raising StructuredOutputError to
+    reject it. A reply that fails either step gets one repair request that
+    shows the model its own output and the error, instead of regenerating
+    from scratch.
+    """
+    if settings.structured_output_mode != "off":
+        kwargs["response_format"] = response_format(output_type, name)
+
+    llm = get_llm_client()
+
+    def convert(text: str) -> T:
+        value = parse(text, output_type)
+        if check:
+            try:
+                value = check(value)
+            except StructuredOutputError as e:
+                raise StructuredOutputError(str(e), content=text) from e
+        return value
+
+    async def attempt(attempt_messages: list) -> T:
+        parsed: List[T] = []
+        validated = False
+
+        def validate(text: str) -> None:
+            nonlocal validated
+            validated = True
+            parsed.append(convert(text))
+
+        try:
+            text = await llm.complete(attempt_messages, validate=validate, **kwargs)
+        except StructuredOutputError as e:
+            if validated:
+                raise
+            # A shared in-flight reply rejected by another caller; run our own check on it
+            return convert(e.content)
+        # Cached and shared in-flight replies come back without running validate
+        return parsed[0] if parsed else convert(text)
+
+    try:
+        return await attempt(messages)
+    except StructuredOutputError as e:
+        logger.warning(f"Repairing {name} output: {e}")
+        repair_messages = messages + [
+            {"role": "assistant", "content": e.content},
+            {"role": "user", "content": REPAIR_PROMPT.format(error=e)}
+        ]
+
+    kwargs["temperature"] = 0
+    # The original prompt already fit its budget; the repair turns must not push it out
+    kwargs.pop("prompt_budget", None)
+    return await attempt(repair_messages)
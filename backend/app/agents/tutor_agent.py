@@ -1,24 +1,45 @@
 """AI Tutor Agent using OpenAI ChatGPT."""
-from typing import Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+from contextlib import aclosing
+from typing import AsyncIterator, Literal, Optional
+from pydantic import BaseModel, Field
 import logging
-from openai import AsyncOpenAI
 
 from ..config import get_settings
+from ..llm.client import get_llm_client
+from ..llm.routing import route
+from ..llm.scheduler import Priority
+from ..utils import fit_to_token_budget
+from .structured_output import complete_structured
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Initialize OpenAI client
-client = AsyncOpenAI(api_key=settings.openai_api_key)
+SUMMARY_PROMPT = """You summarize tutoring conversations so they can be continued later.
+
+Keep the topics covered, what the student understood or struggled with,
+open questions and any preferences they stated. Write concise plain prose
+and respond with the summary only."""
+
+class GradedAnswer(BaseModel):
+    """Graded answer structure."""
+    is_correct: bool
+    score: float = Field(..., ge=0, le=100)
+    feedback: str
+
+class Recommendation(BaseModel):
+    """Next-step recommendation structure."""
+    quick_tip: str
+    suggestion: str
+    estimated_time: str
+    priority: Literal["low", "medium", "high"]
+    action_type: Literal["practice", "review", "learn", "break"]
 
 class TutorAgent:
     """AI Tutor Agent using ChatGPT."""
     
     def __init__(self):
-        self.model = settings.openai_model
         self.system_prompt = self._get_system_prompt()
-        logger.info(f"TutorAgent initialized with model: {self.model}")
+        logger.info(f"TutorAgent initialized with models: {settings.openai_small_model}, {settings.openai_model}")
     
     @staticmethod
     def _get_system_prompt() -> str:
@@ -40,51 +61,140 @@ Guidelines:
 - Keep responses under 300 words unless explaining complex topics
 - Format code and math clearly"""
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=2, max=30))
-    async def chat(self, message: str, context: Optional[str] = None) -> str:
-        """Chat with tutor using ChatGPT."""
+    def _build_chat_messages(
+        self,
+        message: str,
+        context: Optional[str] = None,
+        history: Optional[list] = None
+    ) -> list:
+        """Build the message list for a single tutor turn."""
         messages = [
             {"role": "system", "content": self.system_prompt}
         ]
         
+        if history:
+            messages.extend(history)
+        
         if context:
             messages.append({"role": "user", "content": f"Context: {context}"})
         
         messages.append({"role": "user", "content": message})
+        return messages
+    
+    async def chat(self, message: str, context: Optional[str] = None, history: Optional[list] = None) -> str:
+        """Chat with tutor using ChatGPT."""
+        messages = self._build_chat_messages(message, context, history)
         
-        response = await client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            max_tokens=1000,
-            temperature=0.7
-        )
+        return await get_llm_client().complete(messages, **route("tutor_chat", messages))
+    
+    async def stream_chat(
+        self,
+        message: str,
+        context: Optional[str] = None,
+        history: Optional[list] = None
+    ) -> AsyncIterator[str]:
+        """Stream a tutor reply, yielding content deltas as they arrive."""
+        messages = self._build_chat_messages(message, context, history)
         
-        return response.choices[0].message.content
+        # Close the upstream stream as soon as our consumer stops early
+        async with aclosing(get_llm_client().stream(messages, **route("tutor_chat", messages))) as stream:
+            async for delta in stream:
+                yield delta
     
     async def get_response(self, message: str, history: list = None) -> str:
-        """Get response from tutor with history support."""
+        """Get response from tutor with history support (agent chat)."""
         messages = [
             {"role": "system", "content": self.system_prompt}
         ]
         
-        # Add history if provided
+        # Add as much recent history as fits the prompt budget
         if history:
-            for msg in history[-10:]:  # Last 10 messages for context
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                if role in ['user', 'assistant', 'system']:
-                    messages.append({"role": role, "content": content})
+            history = [
+                {"role": msg.get('role', 'user'), "content": msg.get('content', '')}
+                for msg in history
+                if msg.get('role', 'user') in ['user', 'assistant', 'system']
+            ]
+            messages.extend(fit_to_token_budget(history, settings.context_token_budget))
         
         messages.append({"role": "user", "content": message})
         
-        response = await client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            max_tokens=1000,
-            temperature=0.7
+        return await get_llm_client().complete(messages, **route("agent_chat", messages))
+    
+    async def grade(self, problem: str, solution: Optional[str], answer: str) -> GradedAnswer:
+        """Grade a student answer against the problem and reference solution."""
+        prompt = f"""Grade this student's answer to a practice problem.
+
+Problem:
+{problem}
+
+Reference solution:
+{solution or 'Not available'}
+
+Student answer:
+{answer}
+
+Respond with ONLY a JSON object:
+{{"is_correct": true or false, "score": <number from 0 to 100>, "feedback": "Constructive, encouraging feedback (2-4 sentences)"}}"""
+        
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        return await complete_structured(
+            GradedAnswer,
+            "graded_answer",
+            messages,
+            priority=Priority.GRADING,
+            **route("grading", messages)
+        )
+    
+    async def recommend(self, context: str) -> Recommendation:
+        """Recommend a next step from a summary of the user's learning context."""
+        prompt = f"""Based on this user's learning context, provide a brief, helpful recommendation.
+
+{context}
+
+Respond in this exact JSON format:
+{{
+    "quick_tip": "A short motivational tip (1 sentence)",
+    "suggestion": "What the user should do next (2-3 sentences max)",
+    "estimated_time": "Time estimate like '5 min' or '15 min'",
+    "priority": "low" or "medium" or "high",
+    "action_type": "practice" or "review" or "learn" or "break"
+}}
+
+Be encouraging and specific. If they're new, suggest starting with basics. If they've been practicing a lot, maybe suggest a break or review."""
+        
+        return await complete_structured(
+            Recommendation,
+            "recommendation",
+            [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            priority=Priority.BACKGROUND,
+            **route("recommendation")
         )
+    
+    async def summarize(self, previous_summary: Optional[str], turns: list) -> str:
+        """Fold conversation turns into a rolling summary."""
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        prompt = f"""Current summary:
+{previous_summary or '(none yet)'}
+
+New conversation turns:
+{transcript}
+
+Update the summary to include the new turns."""
         
-        return response.choices[0].message.content
+        return await get_llm_client().complete(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            priority=Priority.BACKGROUND,
+            **route("summary")
+        )
 
 _tutor_agent: Optional[TutorAgent] = None
 
@@ -0,0 +1,79 @@
+"""In-memory caches."""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a time-to-live.
+
+    Entries are bounded by count and, when maxbytes is set, by the total
+    size reported by sizeof.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        maxbytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof or (lambda value: 1)
+        self.currbytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a live entry and mark it as recently used."""
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        value, expires_at, _ = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store an entry, evicting the least recently used ones when full."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        size = self.sizeof(value)
+
+        if self.maxbytes is not None and size > self.maxbytes:
+            # Never let one oversized entry flush the whole cache
+            self._remove(key)
+            return
+
+        self._remove(key)
+        self._data[key] = (value, expires_at, size)
+        self.currbytes += size
+
+        while len(self._data) > self.maxsize or (
+            self.maxbytes is not None and self.currbytes > self.maxbytes
+        ):
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self.currbytes -= evicted_size
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value."""
+        item = self._remove(key)
+        return default if item is None else item[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.currbytes = 0
+
+    def _remove(self, key: Hashable) -> Optional[tuple]:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.currbytes -= item[2]
+        return item
+
+    def __len__(self) -> int:
+        return len(self._data)
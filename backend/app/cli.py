@@ -0,0 +1,43 @@
+"""Command-line maintenance tasks.
+
+Run from the backend directory:
+    python -m app.cli rebuild-stats [--user-id ID]
+"""
+import argparse
+import asyncio
+import logging
+
+from .database import sessionmanager
+from .services.stats_service import StatsService
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_stats(user_id=None) -> None:
+    """Rebuild statistics rollups from the source tables."""
+    sessionmanager.init()
+    try:
+        await sessionmanager.create_all()
+        async with sessionmanager.session() as db:
+            count = await StatsService.rebuild(db, user_id)
+        logger.info(f"Rebuilt stats for {count} users")
+    finally:
+        await sessionmanager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AI Learning Companion maintenance tasks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subparsers.add_parser("rebuild-stats", help="Recompute user statistics rollups")
+    rebuild.add_argument("--user-id", type=int, help="Only rebuild this user")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "rebuild-stats":
+        asyncio.run(rebuild_stats(args.user_id))
+
+
+if __name__ == "__main__":
+    main()
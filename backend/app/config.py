@@ -1,8 +1,26 @@
 """Application configuration."""
 from pydantic_settings import BaseSettings
-from pydantic import field_validator
+from pydantic import BaseModel, field_validator
 from functools import lru_cache
-from typing import List, Union
+from typing import Dict, List, Literal, Optional, Union
+
+class LLMRoute(BaseModel):
+    """Model and output limits for one LLM call site."""
+    tier: Literal["small", "large"] = "large"
+    model: Optional[str] = None  # Overrides the tier's model
+    max_tokens: int
+    temperature: float
+    prompt_budget: int = 4000  # Prompts are trimmed to this many tokens
+    escalate: bool = False  # Use the large model when the prompt looks complex
+
+DEFAULT_LLM_ROUTES = {
+    "tutor_chat": {"tier": "small", "max_tokens": 1000, "temperature": 0.7, "prompt_budget": 5000, "escalate": True},
+    "agent_chat": {"tier": "small", "max_tokens": 300, "temperature": 0.7, "prompt_budget": 1200, "escalate": True},
+    "grading": {"tier": "small", "max_tokens": 250, "temperature": 0, "prompt_budget": 3000, "escalate": True},
+    "recommendation": {"tier": "small", "max_tokens": 200, "temperature": 0.7, "prompt_budget": 800},
+    "problem_generation": {"tier": "large", "max_tokens": 1000, "temperature": 0.7, "prompt_budget": 800},
+    "summary": {"tier": "small", "max_tokens": 400, "temperature": 0.3, "prompt_budget": 6000},
+}
 
 class Settings(BaseSettings):
     """Application settings."""
@@ -14,22 +32,133 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite+aiosqlite:///./learning.db"
+    database_write_pool_size: int = 5
+    database_read_pool_size: int = 10  # Read-only connections for GET endpoints (SQLite files)
+    sqlite_performance_mode: bool = True  # WAL journal, synchronous=NORMAL, larger page cache and mmap
+    sqlite_busy_timeout_ms: int = 10000  # How long a write waits for another writer
+    sqlite_cache_size_mb: int = 64  # Page cache per connection
+    sqlite_mmap_size_mb: int = 256
     
     # OpenAI (ChatGPT)
     openai_api_key: str
     openai_model: str = "gpt-4o"  # Options: gpt-4o, gpt-4o-mini, gpt-4-turbo, gpt-3.5-turbo
+    openai_small_model: str = "gpt-4o-mini"  # Used by call sites routed to the small tier
+    openai_base_url: Optional[str] = None  # Any OpenAI-compatible server, e.g. a local one
+    
+    # LLM provider and HTTP connection pool
+    llm_provider: Literal["openai", "fake"] = "openai"  # fake answers in-process, for offline runs
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry_seconds: float = 60
+    llm_http2: bool = False  # Needs httpx[http2]
+    llm_warmup: bool = True  # Open a provider connection at startup
+    llm_fake_latency_seconds: float = 0.0
+    llm_fake_chunk_delay_seconds: float = 0.0
+    
+    # LLM cassettes: record completions to a file, then replay them offline
+    llm_cassette_mode: Literal["off", "record", "replay"] = "off"
+    llm_cassette_path: str = "./llm_cassette.jsonl"
+    llm_cassette_latency: Literal["recorded", "none", "lognormal"] = "recorded"  # Replay delays
+    llm_cassette_latency_scale: float = 1.0  # Multiplies recorded latencies
+    llm_cassette_latency_median_seconds: float = 1.0  # For lognormal
+    llm_cassette_latency_sigma: float = 0.5
+    llm_cassette_seed: Optional[int] = None
+    structured_output_mode: Literal["json_schema", "json_object", "off"] = "json_schema"  # response_format sent for JSON replies
+    
+    # LLM routing: per call site model tier, output limit and temperature
+    llm_routes: Dict[str, LLMRoute] = DEFAULT_LLM_ROUTES
+    llm_escalation_enabled: bool = True  # Send complex prompts on escalating routes to the large model
+    llm_escalation_min_chars: int = 1500  # Prompt length that counts as complex
+    
+    # LLM usage accounting
+    llm_usage_flush_interval_seconds: float = 10  # Usage counters are written in batches
+    llm_daily_token_quota: int = 0  # Tokens per user per UTC day; 0 disables
+    prompt_field_max_tokens: int = 150  # Cap on free-text profile fields (e.g. learning goals) in prompts
+    
+    # LLM scheduling
+    llm_max_concurrency: int = 8  # Upstream calls in flight at once
+    llm_interactive_reserved_slots: int = 2  # Slots only chat may use
+    
+    # LLM deadlines, hedging and circuit breaker
+    llm_timeout_chat_seconds: float = 30
+    llm_timeout_grading_seconds: float = 20
+    llm_timeout_generation_seconds: float = 60
+    llm_timeout_background_seconds: float = 60
+    llm_stream_idle_timeout_seconds: float = 20  # Longest gap allowed between streamed chunks
+    llm_max_attempts: int = 2  # Attempts per call for transient upstream errors, within the deadline
+    llm_hedge_enabled: bool = True  # Send a second request when the first is slower than usual
+    llm_hedge_percentile: float = 95
+    llm_hedge_min_delay_seconds: float = 1.0
+    llm_breaker_failure_ratio: float = 0.5  # Open the breaker when this share of recent calls failed
+    llm_breaker_min_calls: int = 10
+    llm_breaker_window: int = 20
+    llm_breaker_cooldown_seconds: float = 30
+    
+    # LLM response cache
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 5000
+    llm_cache_max_bytes: int = 50_000_000  # In-memory tier size limit
+    llm_cache_ttl_seconds: int = 3600
+    llm_cache_path: Optional[str] = None  # SQLite file for a cache tier that survives restarts
+    
+    # Conversation memory
+    context_token_budget: int = 3000  # Prompt tokens for summary + recent turns
+    context_max_messages: int = 100  # Upper bound on recent turns scanned per request
+    
+    # Practice problem pool
+    problem_pool_enabled: bool = True
+    problem_pool_size: int = 3  # Unattempted banked problems kept per (topic, difficulty)
+    problem_pool_low_watermark: int = 2  # Refill when a pool drops below this
+    problem_pool_workers: int = 2
+    problem_pool_trending_topics: int = 10  # Most requested user topics kept warm
+    
+    # Stats
+    recent_activity_limit: int = 20
+    
+    # Recommendations
+    recommendation_llm_enabled: bool = True  # Refine rule-based tips with the LLM when stats change
+    recommendation_cache_size: int = 10000
+    recommendation_cache_ttl_seconds: int = 86400
     
     # JWT
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1440
+    password_hash_rounds: int = 12  # bcrypt cost factor for new hashes
+    password_hash_workers: int = 4  # bcrypt threads; bcrypt releases the GIL
+    password_hash_max_pending: int = 64  # Hashes running or queued before logins get 503
+    auth_cache_ttl_seconds: int = 60  # How long a signed-in user is trusted without a DB check (0 disables)
+    auth_cache_size: int = 10000
+    
+    # Admin
+    admin_usernames: Union[str, List[str]] = []  # Users allowed to call /api/admin endpoints
+    bulk_import_chunk_size: int = 500  # Rows checked, hashed and inserted together
+    bulk_import_hash_workers: Optional[int] = None  # Hashing processes; defaults to the CPU count
     
     # Rate Limiting
-    rate_limit_per_minute: int = 60
+    rate_limit_per_minute: int = 60  # Upstream LLM calls per user; 0 disables
     
     # CORS
     cors_origins: Union[str, List[str]] = ["*"]
     
+    @field_validator('llm_routes', mode='before')
+    @classmethod
+    def merge_llm_routes(cls, v):
+        # Overrides only need to name the routes and fields they change
+        routes = {name: dict(route) for name, route in DEFAULT_LLM_ROUTES.items()}
+        for name, route in (v or {}).items():
+            if isinstance(route, BaseModel):
+                route = route.model_dump(exclude_unset=True)
+            routes.setdefault(name, {}).update(route)
+        return routes
+    
+    @field_validator('admin_usernames', mode='before')
+    @classmethod
+    def parse_admin_usernames(cls, v):
+        if isinstance(v, str):
+            return [name.strip() for name in v.split(',') if name.strip()]
+        return v
+    
     @field_validator('cors_origins', mode='before')
     @classmethod
     def parse_cors_origins(cls, v):
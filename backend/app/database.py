@@ -1,4 +1,7 @@
 """Async database configuration."""
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from typing import AsyncGenerator
@@ -18,14 +21,38 @@ class DatabaseSessionManager:
     def __init__(self):
         self.engine = None
         self.session_factory = None
+        self.read_engine = None
+        self.read_session_factory = None
     
     def init(self):
-        """Initialize database."""
-        self.engine = create_async_engine(
-            settings.database_url,
-            echo=settings.debug,
-            future=True,
-        )
+        """Initialize database.
+        
+        File-based SQLite gets a separate read-only connection pool for
+        read_session(); with WAL, readers there never wait for a writer.
+        """
+        url = make_url(settings.database_url)
+        sqlite_file = url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+        
+        if sqlite_file:
+            self.engine = create_async_engine(
+                url,
+                echo=settings.debug,
+                pool_size=settings.database_write_pool_size
+            )
+            self.read_engine = create_async_engine(
+                url,
+                echo=settings.debug,
+                pool_size=settings.database_read_pool_size
+            )
+            event.listen(self.engine.sync_engine, "connect", _sqlite_pragmas(read_only=False))
+            event.listen(self.read_engine.sync_engine, "connect", _sqlite_pragmas(read_only=True))
+        else:
+            self.engine = create_async_engine(
+                url,
+                echo=settings.debug,
+                future=True,
+            )
+            self.read_engine = self.engine
         
         self.session_factory = async_sessionmaker(
             self.engine,
@@ -33,11 +60,19 @@ class DatabaseSessionManager:
             expire_on_commit=False,
             autoflush=False,
         )
+        self.read_session_factory = async_sessionmaker(
+            self.read_engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autoflush=False,
+        )
         
         logger.info("Database initialized")
     
     async def close(self):
         """Close database connections."""
+        if self.read_engine and self.read_engine is not self.engine:
+            await self.read_engine.dispose()
         if self.engine:
             await self.engine.dispose()
     
@@ -55,6 +90,15 @@ class DatabaseSessionManager:
                 await session.rollback()
                 raise
     
+    @asynccontextmanager
+    async def read_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """Get a session for queries only; nothing in it is committed."""
+        if not self.read_session_factory:
+            raise RuntimeError("DatabaseSessionManager not initialized")
+        
+        async with self.read_session_factory() as session:
+            yield session
+    
     async def create_all(self):
         """Create all tables."""
         if not self.engine:
@@ -62,12 +106,88 @@ class DatabaseSessionManager:
         
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_upgrade_tables)
         
         logger.info("Database tables created")
 
+# Columns added to tables that existing databases already have; create_all
+# only creates missing tables, so these are added at startup when absent
+ADDED_COLUMNS = {
+    "conversations": ["summary", "summary_message_id"],
+    "messages": ["token_count"],
+    "practice_sessions": ["problem_id"],
+}
+
+def _upgrade_tables(conn):
+    """Add missing ADDED_COLUMNS and indexes to existing tables and backfill old rows."""
+    inspector = inspect(conn)
+    for table_name, column_names in ADDED_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        table = Base.metadata.tables[table_name]
+        for name in column_names:
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+                logger.info(f"Added column {table_name}.{name}")
+    
+    # Conversations from before updated_at had a default; the list is ordered by it
+    result = conn.execute(text(
+        "UPDATE conversations SET updated_at = created_at WHERE updated_at IS NULL"
+    ))
+    if result.rowcount:
+        logger.info(f"Backfilled updated_at for {result.rowcount} conversations")
+    
+    # Indexes added to existing tables; create_all only makes them with the table
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in existing for column in index.columns):
+                index.create(conn, checkfirst=True)
+
+def _sqlite_pragmas(read_only: bool):
+    """Connect hook applying the SQLite settings to each new connection."""
+    def on_connect(dbapi_connection, connection_record):
+        pragmas = [f"busy_timeout = {settings.sqlite_busy_timeout_ms}"]
+        if settings.sqlite_performance_mode:
+            if not read_only:
+                pragmas.append("journal_mode = WAL")
+            pragmas += [
+                "synchronous = NORMAL",
+                f"cache_size = -{settings.sqlite_cache_size_mb * 1024}",
+                f"mmap_size = {settings.sqlite_mmap_size_mb * 1024 * 1024}",
+                "temp_store = MEMORY"
+            ]
+        if read_only:
+            pragmas.append("query_only = ON")
+        
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+    return on_connect
+
 sessionmanager = DatabaseSessionManager()
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency to get database session."""
     async with sessionmanager.session() as session:
         yield session
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency to get a read-only database session, for GET endpoints."""
+    async with sessionmanager.read_session() as session:
+        yield session
+
+def conflict_insert(db: AsyncSession, entity):
+    """INSERT for the session's dialect, supporting on_conflict_do_nothing().
+    
+    SQLite and PostgreSQL share the ON CONFLICT syntax; other databases
+    are not supported by the services that need it.
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(entity)
+    if dialect == "postgresql":
+        return postgresql.insert(entity)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
@@ -1,28 +1,37 @@
 """FastAPI dependencies."""
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import get_db
-from .services.auth_service import AuthService
-from .models.db_models import User
+from .config import get_settings
+from .llm.scheduler import current_user_id
+from .services.auth_service import get_principal_cache
+from .models.schemas import Principal
+
+settings = get_settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    """Get current authenticated user."""
-    payload = AuthService.decode_token(token)
-    username = payload.get("sub")
-    
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Get current authenticated user.
     
-    user = await AuthService.get_user_by_username(db, username)
+    Served from the principal cache, so most requests make no query here;
+    load the User row when it has to be changed.
+    """
+    cache = get_principal_cache()
+    username = cache.subject(token)
+    user = await cache.principal(username)
     
-    if not user or not user.is_active:
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid user")
     
+    # Attribute LLM calls made while handling this request to the user
+    current_user_id.set(user.id)
+    
     return user
+
+async def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """Get current user if they are listed in admin_usernames."""
+    if current_user.username not in settings.admin_usernames:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return current_user
@@ -0,0 +1,158 @@
+"""Record and replay LLM completions for offline, reproducible runs."""
+from collections import defaultdict
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Literal, Optional
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+
+from .providers import Completion, LLMProvider
+from .response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+CHUNK_RE = re.compile(r'\s*\S+')
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+class CassetteProvider(LLMProvider):
+    """Records completions from another provider to a cassette, or replays them.
+
+    A cassette is a JSON Lines file with one completion per line, keyed by
+    the same request hash as the response cache, along with its latency,
+    token usage and (for streams) the chunks as they arrived. Requests
+    recorded several times are replayed in turn.
+
+    Replay latency is either the recorded one (times latency_scale), none,
+    or drawn from a lognormal distribution around latency_median; streams
+    are replayed chunk by chunk with the same time to first chunk.
+    """
+
+    name = "cassette"
+
+    def __init__(
+        self,
+        path: str,
+        inner: Optional[LLMProvider] = None,
+        latency: Literal["recorded", "none", "lognormal"] = "recorded",
+        latency_scale: float = 1.0,
+        latency_median: float = 1.0,
+        latency_sigma: float = 0.5,
+        seed: Optional[int] = None
+    ):
+        self.path = path
+        self.inner = inner
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.random = random.Random(seed)
+
+        self._entries: Dict[str, List[dict]] = defaultdict(list)
+        self._next: Dict[str, int] = defaultdict(int)
+        self._file = None
+        if inner is None:
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        logger.info(f"Loaded {sum(map(len, self._entries.values()))} LLM completions from {self.path}")
+
+    def _record(self, request: dict, entry: dict) -> None:
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        entry = {"key": ResponseCache.key(**request), "model": request.get("model"), **entry}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def _lookup(self, request: dict) -> dict:
+        key = ResponseCache.key(**request)
+        entries = self._entries.get(key)
+        if not entries:
+            raise CassetteMiss(f"No recorded completion for {request.get('model')} request {key[:12]}")
+        index = self._next[key]
+        self._next[key] = index + 1
+        return entries[index % len(entries)]
+
+    def _delay(self, entry: dict) -> float:
+        if self.latency == "none":
+            return 0.0
+        if self.latency == "lognormal":
+            return self.random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+        return entry["latency"] * self.latency_scale
+
+    async def start(self) -> None:
+        if self.inner:
+            await self.inner.start()
+
+    async def complete(self, request: dict) -> Completion:
+        if self.inner:
+            started = time.monotonic()
+            completion = await self.inner.complete(request)
+            self._record(request, {
+                "content": completion.content,
+                "prompt_tokens": completion.prompt_tokens,
+                "completion_tokens": completion.completion_tokens,
+                "latency": round(time.monotonic() - started, 4)
+            })
+            return completion
+
+        entry = self._lookup(request)
+        delay = self._delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        return Completion(entry["content"], entry.get("prompt_tokens", 0), entry.get("completion_tokens", 0))
+
+    async def stream(self, request: dict) -> AsyncIterator[str]:
+        if self.inner:
+            started = time.monotonic()
+            first_chunk = None
+            chunks = []
+            async with aclosing(self.inner.stream(request)) as stream:
+                async for delta in stream:
+                    if first_chunk is None:
+                        first_chunk = round(time.monotonic() - started, 4)
+                    chunks.append(delta)
+                    yield delta
+            # Only streams received in full are recorded
+            self._record(request, {
+                "content": "".join(chunks),
+                "chunks": chunks,
+                "latency": round(time.monotonic() - started, 4),
+                "first_chunk_latency": first_chunk
+            })
+            return
+
+        entry = self._lookup(request)
+        chunks = entry.get("chunks") or CHUNK_RE.findall(entry["content"]) or [""]
+        total = self._delay(entry)
+        first = total
+        if entry.get("first_chunk_latency") is not None and entry["latency"]:
+            first = total * entry["first_chunk_latency"] / entry["latency"]
+        interval = (total - first) / (len(chunks) - 1) if len(chunks) > 1 else 0.0
+
+        for i, delta in enumerate(chunks):
+            delay = first if i == 0 else interval
+            if delay:
+                await asyncio.sleep(delay)
+            yield delta
+
+    async def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self.inner:
+            await self.inner.close()
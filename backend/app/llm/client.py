@@ -0,0 +1,418 @@
+"""Shared chat completion client."""
+from typing import AsyncIterator, Callable, Dict, Optional
+import asyncio
+import logging
+import random
+import time
+
+from ..config import get_settings
+from ..utils import estimate_tokens, fit_prompt
+from .providers import LLMProvider, create_provider
+from .resilience import RETRYABLE_ERRORS, CircuitBreaker, LatencyTracker, LLMUnavailable
+from .response_cache import ResponseCache
+from .scheduler import LLMScheduler, Priority, current_user_id
+from .singleflight import SingleFlight
+from .usage import UsageLedger
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class LLMClient:
+    """Single entry point for chat completions used by all agents.
+
+    Completions are served from an exact-match response cache when
+    possible; callers pass use_cache=False for requests that must produce
+    a fresh answer every time.
+
+    Every upstream call runs against a deadline for its priority class
+    (queueing included). Slow calls are hedged with a second request once
+    they exceed the class's recent latency percentile, when a scheduler
+    slot is free for it without waiting. Transient failures are retried
+    while the deadline allows, and a circuit breaker makes calls fail fast
+    with LLMUnavailable while the upstream is unhealthy.
+
+    Completions come from a provider backend, so the same client runs
+    against OpenAI, a local OpenAI-compatible server or an in-process fake.
+
+    Prompts are trimmed to the call site's token budget before they are
+    sent, and the tokens each upstream call uses are recorded per user and
+    call site in the usage ledger, which also enforces the daily quota.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        scheduler: LLMScheduler,
+        cache: Optional[ResponseCache] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        timeouts: Optional[Dict[Priority, float]] = None,
+        stream_idle_timeout: float = 20,
+        max_attempts: int = 2,
+        hedge_percentile: Optional[float] = 95,
+        hedge_min_delay: float = 1.0,
+        usage: Optional[UsageLedger] = None
+    ):
+        self.provider = provider
+        self.scheduler = scheduler
+        self.cache = cache
+        self.breaker = breaker or CircuitBreaker()
+        self.timeouts = timeouts or {}
+        self.stream_idle_timeout = stream_idle_timeout
+        self.max_attempts = max_attempts
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.usage = usage
+        self.latency = LatencyTracker()
+        self.inflight = SingleFlight()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.timed_out = 0
+
+    async def complete(
+        self,
+        messages: list,
+        *,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        validate: Optional[Callable[[str], object]] = None,
+        call_site: str = "other",
+        prompt_budget: Optional[int] = None,
+        **params
+    ) -> str:
+        """Get the text of a chat completion.
+
+        Identical requests already in flight in the same priority class and
+        with the same deadline share one upstream call, so a caller never
+        inherits a lower class's queue position or deadline.
+        validate is called on fresh completions before they are cached, so
+        a reply it rejects by raising is never served from the cache.
+        """
+        if prompt_budget:
+            messages = fit_prompt(messages, prompt_budget)
+        key = ResponseCache.key(model, messages, temperature, max_tokens, **params)
+        if self.cache and use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+        if self.usage:
+            await self.usage.check_quota(current_user_id.get())
+
+        request = dict(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **params
+        )
+
+        async def fetch() -> str:
+            completion = await self._call(priority, timeout, request)
+            content = completion.content
+            self._record_usage(
+                call_site,
+                completion.prompt_tokens or self._prompt_tokens(messages),
+                completion.completion_tokens or estimate_tokens(content)
+            )
+            if validate:
+                validate(content)
+
+            if self.cache and use_cache and content:
+                await self.cache.set(key, content)
+            return content
+
+        return await self.inflight.do(f"{key}:{int(priority)}:{timeout}", fetch)
+
+    async def stream(
+        self,
+        messages: list,
+        *,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        call_site: str = "other",
+        prompt_budget: Optional[int] = None,
+        **params
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding content deltas as they arrive.
+
+        The deadline covers queueing and the wait for the first chunk;
+        after that the stream fails if no chunk arrives within the idle
+        timeout. A cached completion is replayed as a single delta, and a
+        stream is only cached once it has been received in full.
+        """
+        if prompt_budget:
+            messages = fit_prompt(messages, prompt_budget)
+        key = None
+        if self.cache and use_cache:
+            key = ResponseCache.key(model, messages, temperature, max_tokens, **params)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        if self.usage:
+            await self.usage.check_quota(current_user_id.get())
+        self.breaker.check()
+        deadline = time.monotonic() + self._timeout(priority, timeout)
+
+        try:
+            await asyncio.wait_for(
+                self.scheduler.acquire(priority, current_user_id.get()),
+                deadline - time.monotonic()
+            )
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise LLMUnavailable("Timed out waiting for an LLM slot")
+
+        parts = []
+        stream = self.provider.stream(dict(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **params
+        ))
+        # The slot is held until the stream is fully received or abandoned
+        try:
+            wait = max(deadline - time.monotonic(), 0.001)
+            while True:
+                try:
+                    delta = await asyncio.wait_for(stream.__anext__(), wait)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.timed_out += 1
+                    self.breaker.record_failure()
+                    raise LLMUnavailable(
+                        "LLM stream stalled" if parts else "LLM stream did not start before the deadline"
+                    )
+                except RETRYABLE_ERRORS as e:
+                    self.breaker.record_failure()
+                    raise LLMUnavailable(str(e)) from e
+                wait = self.stream_idle_timeout
+                parts.append(delta)
+                yield delta
+            self.breaker.record_success()
+        finally:
+            # Release the upstream connection even if the consumer stops early
+            await stream.aclose()
+            self.scheduler.release(priority)
+            if parts:
+                # Streams do not report usage, so it is estimated
+                self._record_usage(call_site, self._prompt_tokens(messages), estimate_tokens("".join(parts)))
+
+        if key and parts:
+            await self.cache.set(key, "".join(parts))
+
+    @staticmethod
+    def _prompt_tokens(messages: list) -> int:
+        return sum(estimate_tokens(message.get("content")) for message in messages)
+
+    def _record_usage(self, call_site: str, prompt_tokens: int, completion_tokens: int) -> None:
+        if self.usage:
+            self.usage.record(current_user_id.get(), call_site, prompt_tokens, completion_tokens)
+
+    def _timeout(self, priority: Priority, timeout: Optional[float]) -> float:
+        return timeout or self.timeouts.get(priority, 60)
+
+    async def _call(self, priority: Priority, timeout: Optional[float], request: dict):
+        """Run one logical upstream call within its deadline.
+
+        Only time spent on upstream attempts counts against the circuit
+        breaker; running out of time while queued for a slot is a local
+        backlog, not an upstream failure.
+        """
+        self.breaker.check()
+        deadline = time.monotonic() + self._timeout(priority, timeout)
+
+        try:
+            await asyncio.wait_for(
+                self.scheduler.acquire(priority, current_user_id.get()),
+                deadline - time.monotonic()
+            )
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise LLMUnavailable("Timed out waiting for an LLM slot")
+
+        started = time.monotonic()
+        try:
+            if deadline <= started:
+                self.timed_out += 1
+                raise LLMUnavailable("Timed out waiting for an LLM slot")
+            return await asyncio.wait_for(
+                self._attempts(priority, request),
+                deadline - started
+            )
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            # Time left over from a long queue wait may be shorter than a healthy call
+            usual = self.latency.percentile(priority, 95)
+            if usual is None or time.monotonic() - started > usual:
+                self.breaker.record_failure()
+            raise LLMUnavailable("LLM call exceeded its deadline")
+        finally:
+            self.scheduler.release(priority)
+
+    async def _attempts(self, priority: Priority, request: dict):
+        """Send the request, retrying transient failures; the caller holds a slot."""
+        attempt = 1
+        while True:
+            try:
+                return await self._hedged(priority, request)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_attempts or self.breaker.state != "closed":
+                    raise LLMUnavailable(str(e)) from e
+                logger.warning(f"Retrying LLM call after {type(e).__name__}")
+                self.retries += 1
+                # Jittered backoff; the surrounding deadline bounds the total wait
+                await asyncio.sleep(random.uniform(0.2, 0.5) * 2 ** attempt)
+                attempt += 1
+
+    async def _hedged(self, priority: Priority, request: dict):
+        """Send the request, and a second copy if the first is unusually slow."""
+        delay = None
+        if self.hedge_percentile:
+            delay = self.latency.percentile(priority, self.hedge_percentile)
+        if delay is None:
+            return await self._request(priority, request)
+
+        first = asyncio.ensure_future(self._request(priority, request))
+        done, _ = await asyncio.wait({first}, timeout=max(delay, self.hedge_min_delay))
+        if done:
+            return first.result()
+
+        # The hedge needs a slot of its own; never queue for one while the first copy runs
+        if not self.scheduler.try_acquire(priority):
+            return await first
+
+        self.hedged += 1
+        second = asyncio.ensure_future(self._hedge(priority, request))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both copies failed
+            return first.result()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a losing copy's failure as handled
+                    task.exception()
+
+    async def _hedge(self, priority: Priority, request: dict):
+        """Send a hedge copy in the slot taken for it, releasing the slot when done."""
+        try:
+            return await self._request(priority, request)
+        finally:
+            self.scheduler.release(priority)
+
+    async def _request(self, priority: Priority, request: dict):
+        started = time.monotonic()
+        try:
+            completion = await self.provider.complete(request)
+        except RETRYABLE_ERRORS:
+            self.breaker.record_failure()
+            raise
+        self.latency.record(priority, time.monotonic() - started)
+        self.breaker.record_success()
+        return completion
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider.name,
+            "cache": self.cache.stats() if self.cache else None,
+            "in_flight": self.inflight.in_flight(),
+            "upstream_calls": self.inflight.started,
+            "coalesced_calls": self.inflight.coalesced,
+            "hedged_calls": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "timeouts": self.timed_out,
+            "breaker": self.breaker.stats(),
+            "scheduler": self.scheduler.stats(),
+            "usage": self.usage.stats() if self.usage else None
+        }
+
+    async def start(self) -> None:
+        await self.provider.start()
+        if self.usage:
+            await self.usage.start()
+
+    async def close(self) -> None:
+        if self.usage:
+            await self.usage.stop()
+        await self.provider.close()
+        if self.cache:
+            self.cache.close()
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    global _llm_client
+    if _llm_client is None:
+        cache = None
+        if settings.llm_cache_enabled:
+            cache = ResponseCache(
+                max_entries=settings.llm_cache_max_entries,
+                max_bytes=settings.llm_cache_max_bytes,
+                ttl=settings.llm_cache_ttl_seconds,
+                path=settings.llm_cache_path
+            )
+        scheduler = LLMScheduler(
+            max_concurrency=settings.llm_max_concurrency,
+            interactive_reserved=settings.llm_interactive_reserved_slots,
+            rate_limit_per_minute=settings.rate_limit_per_minute
+        )
+        breaker = CircuitBreaker(
+            failure_ratio=settings.llm_breaker_failure_ratio,
+            min_calls=settings.llm_breaker_min_calls,
+            window=settings.llm_breaker_window,
+            cooldown=settings.llm_breaker_cooldown_seconds
+        )
+        timeouts = {
+            Priority.INTERACTIVE: settings.llm_timeout_chat_seconds,
+            Priority.GRADING: settings.llm_timeout_grading_seconds,
+            Priority.GENERATION: settings.llm_timeout_generation_seconds,
+            Priority.BACKGROUND: settings.llm_timeout_background_seconds,
+        }
+        _llm_client = LLMClient(
+            create_provider(),
+            scheduler,
+            cache,
+            breaker=breaker,
+            timeouts=timeouts,
+            stream_idle_timeout=settings.llm_stream_idle_timeout_seconds,
+            max_attempts=settings.llm_max_attempts,
+            hedge_percentile=settings.llm_hedge_percentile if settings.llm_hedge_enabled else None,
+            hedge_min_delay=settings.llm_hedge_min_delay_seconds,
+            usage=UsageLedger(
+                flush_interval=settings.llm_usage_flush_interval_seconds,
+                daily_quota=settings.llm_daily_token_quota
+            )
+        )
+    return _llm_client
+
+
+async def close_llm_client() -> None:
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.close()
+        _llm_client = None
@@ -0,0 +1,219 @@
+"""Backends that serve chat completions for LLMClient."""
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, NamedTuple, Optional
+import asyncio
+import json
+import logging
+
+import httpx
+import openai
+
+from ..config import get_settings
+from ..utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class Completion(NamedTuple):
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMProvider(ABC):
+    """A chat completion backend.
+
+    Requests are the keyword arguments of an OpenAI chat completion call.
+    Providers do not retry; LLMClient owns retries, deadlines and hedging.
+    """
+
+    name = "provider"
+
+    async def start(self) -> None:
+        """Prepare the backend before the first call."""
+
+    @abstractmethod
+    async def complete(self, request: dict) -> Completion:
+        ...
+
+    @abstractmethod
+    def stream(self, request: dict) -> AsyncIterator[str]:
+        """Yield content deltas; closing the iterator closes the upstream stream."""
+
+    async def close(self) -> None:
+        """Release connections."""
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI or any OpenAI-compatible server, over one pooled HTTP client."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60,
+        http2: bool = False,
+        warmup: bool = True
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the h2 package is missing; install httpx[http2]")
+                http2 = False
+
+        self.http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            http2=http2
+        )
+        self.openai = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            # Retries are handled by LLMClient, within each call's deadline
+            max_retries=0
+        )
+        self.warmup = warmup
+
+    async def start(self) -> None:
+        if not self.warmup:
+            return
+        # Open a connection (and TLS session) before the first real call
+        try:
+            await asyncio.wait_for(self.openai.models.list(), 5)
+        except Exception as e:
+            logger.warning(f"LLM connection warm-up failed: {e}")
+
+    async def complete(self, request: dict) -> Completion:
+        response = await self.openai.chat.completions.create(**request)
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content or "",
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0
+        )
+
+    async def stream(self, request: dict) -> AsyncIterator[str]:
+        stream = await self.openai.chat.completions.create(stream=True, **request)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def close(self) -> None:
+        await self.openai.close()
+
+
+FAKE_REPLY = "This is a reply from the fake LLM provider. It answers every prompt the same way."
+
+
+def example_from_schema(schema: dict, defs: Optional[dict] = None):
+    """Build a minimal value that satisfies a JSON schema."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_from_schema(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            return example_from_schema(schema[key][0], defs)
+
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {
+            name: example_from_schema(prop, defs)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [example_from_schema(schema.get("items", {}), defs)]
+    if kind in ("number", "integer"):
+        return schema.get("minimum", schema.get("exclusiveMinimum", 0))
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    return "example"
+
+
+class FakeProvider(LLMProvider):
+    """In-process stand-in for offline runs and benchmarks.
+
+    Replies after a fixed latency. JSON requests get a minimal object that
+    matches the requested schema, so every endpoint works end to end.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, chunk_delay: float = 0.0):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+
+    def _reply(self, request: dict) -> str:
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            return json.dumps(example_from_schema(response_format["json_schema"]["schema"]))
+        if response_format.get("type") == "json_object":
+            return "{}"
+        return FAKE_REPLY
+
+    async def complete(self, request: dict) -> Completion:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = self._reply(request)
+        prompt = "".join(m.get("content") or "" for m in request.get("messages", []))
+        return Completion(content, estimate_tokens(prompt), estimate_tokens(content))
+
+    async def stream(self, request: dict) -> AsyncIterator[str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i, word in enumerate(self._reply(request).split(" ")):
+            if i and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield word if i == 0 else " " + word
+
+
+def create_provider() -> LLMProvider:
+    """Build the provider selected by settings.llm_provider and the cassette mode."""
+    from .cassette import CassetteProvider
+
+    if settings.llm_cassette_mode == "replay":
+        return CassetteProvider(
+            settings.llm_cassette_path,
+            latency=settings.llm_cassette_latency,
+            latency_scale=settings.llm_cassette_latency_scale,
+            latency_median=settings.llm_cassette_latency_median_seconds,
+            latency_sigma=settings.llm_cassette_latency_sigma,
+            seed=settings.llm_cassette_seed
+        )
+    
+    provider = _create_backend()
+    if settings.llm_cassette_mode == "record":
+        return CassetteProvider(settings.llm_cassette_path, inner=provider)
+    return provider
+
+
+def _create_backend() -> LLMProvider:
+    if settings.llm_provider == "fake":
+        return FakeProvider(settings.llm_fake_latency_seconds, settings.llm_fake_chunk_delay_seconds)
+    return OpenAIProvider(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+        http2=settings.llm_http2,
+        warmup=settings.llm_warmup
+    )
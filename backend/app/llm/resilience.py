@@ -0,0 +1,121 @@
+"""Failure handling for upstream LLM calls."""
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+import logging
+import time
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Upstream failures worth retrying and counting against the circuit breaker
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+MIN_HEDGE_SAMPLES = 20
+
+
+class LLMUnavailable(Exception):
+    """Raised when the LLM cannot answer in time or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fails fast while the recent upstream error rate is too high.
+
+    The breaker opens when at least failure_ratio of the last window calls
+    failed, rejects calls for cooldown seconds, then lets a single probe
+    through: a success closes it again, a failure reopens it.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        min_calls: int = 10,
+        window: int = 20,
+        cooldown: float = 30
+    ):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def check(self) -> None:
+        """Raise LLMUnavailable unless a call may go upstream now."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open":
+            now = time.monotonic()
+            # One probe at a time; a probe that never reported back is replaced
+            if self._probe_started is None or now - self._probe_started >= self.cooldown:
+                self._probe_started = now
+                return
+        self.rejected += 1
+        raise LLMUnavailable("LLM circuit breaker is open")
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("LLM circuit breaker closed")
+            self._opened_at = None
+            self._outcomes.clear()
+        self._probe_started = None
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        self._outcomes.append(False)
+        if self._opened_at is not None:
+            # Failed probe: stay open for another cooldown
+            self._opened_at = time.monotonic()
+            self._probe_started = None
+            return
+
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures >= self.failure_ratio * len(self._outcomes):
+            logger.warning(f"LLM circuit breaker opened after {failures}/{len(self._outcomes)} failures")
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_failures": self._outcomes.count(False),
+            "recent_calls": len(self._outcomes),
+            "rejected": self.rejected
+        }
+
+
+class LatencyTracker:
+    """Recent upstream latencies per call class, for choosing hedge delays."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Hashable, Deque[float]] = {}
+
+    def record(self, key: Hashable, seconds: float) -> None:
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, key: Hashable, percentile: float) -> Optional[float]:
+        """Latency percentile, or None until enough calls have been observed."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        index = min(int(len(ordered) * percentile / 100), len(ordered) - 1)
+        return ordered[index]
@@ -0,0 +1,153 @@
+"""Exact-match cache for LLM completions."""
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from ..cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PRUNE_EVERY = 500
+
+
+class SqliteCacheTier:
+    """Completion cache stored in a local SQLite file so it survives restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return row
+
+    def _set(self, key: str, content: str, ttl: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, expires_at) VALUES (?, ?, ?)",
+                (key, content, time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    async def get(self, key: str) -> Optional[tuple]:
+        """Get (content, expires_at) for a live entry."""
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, content: str, ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, content, ttl)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Two-tier completion cache: an in-memory LRU in front of optional SQLite.
+
+    Entries are keyed on everything that determines a completion, so a hit
+    is only served for an identical request.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        max_bytes: int = 50_000_000,
+        ttl: float = 3600,
+        path: Optional[str] = None
+    ):
+        self.ttl = ttl
+        self.memory = TTLCache(
+            maxsize=max_entries,
+            ttl=ttl,
+            maxbytes=max_bytes,
+            sizeof=lambda content: len(content.encode('utf-8'))
+        )
+        self.disk = SqliteCacheTier(path) if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, messages: list, temperature: float, max_tokens: int, **params) -> str:
+        """Hash a request, ignoring whitespace differences around message text."""
+        normalized = [
+            {
+                "role": message.get("role", "user"),
+                "content": (message.get("content") or "").replace('\r\n', '\n').strip()
+            }
+            for message in messages
+        ]
+        payload = json.dumps(
+            [model, normalized, temperature, max_tokens, params],
+            sort_keys=True,
+            separators=(',', ':'),
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached completion, promoting disk hits into memory."""
+        content = self.memory.get(key)
+        if content is not None:
+            self.hits += 1
+            return content
+
+        if self.disk:
+            try:
+                row = await self.disk.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache disk read failed: {e}")
+                row = None
+            if row:
+                content, expires_at = row
+                self.memory.set(key, content, ttl=max(expires_at - time.time(), 1))
+                self.hits += 1
+                self.disk_hits += 1
+                return content
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, content: str) -> None:
+        self.memory.set(key, content)
+        if self.disk:
+            try:
+                await self.disk.set(key, content, self.ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache disk write failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.memory),
+            "bytes": self.memory.currbytes
+        }
+
+    def close(self) -> None:
+        if self.disk:
+            self.disk.close()
@@ -0,0 +1,45 @@
+"""Model routing for LLM call sites."""
+from typing import Optional
+import re
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Signs that a prompt needs more reasoning than the small model handles well
+COMPLEX_RE = re.compile(
+    r'```|\\(?:frac|int|sum|lim|begin)\b|\$\$'
+    r'|\b(?:prove|proof|derive|derivation|step[- ]by[- ]step|time complexity|optimi[sz]e|debug|traceback)\b',
+    re.IGNORECASE
+)
+
+
+def is_complex(messages: list) -> bool:
+    """Guess whether a prompt needs the large model, from its last message."""
+    text = (messages[-1].get("content") or "") if messages else ""
+    return len(text) >= settings.llm_escalation_min_chars or bool(COMPLEX_RE.search(text))
+
+
+def route(name: str, messages: Optional[list] = None) -> dict:
+    """Get model, output limit, temperature and prompt budget for a call site.
+
+    Routes marked escalate move to the large model when the prompt looks
+    complex; the output limit stays the same.
+    """
+    config = settings.llm_routes[name]
+    model = config.model or (settings.openai_small_model if config.tier == "small" else settings.openai_model)
+    if (
+        config.escalate
+        and settings.llm_escalation_enabled
+        and messages
+        and is_complex(messages)
+    ):
+        model = settings.openai_model
+
+    return {
+        "model": model,
+        "max_tokens": config.max_tokens,
+        "temperature": config.temperature,
+        "prompt_budget": config.prompt_budget,
+        "call_site": name
+    }
@@ -0,0 +1,194 @@
+"""Priority scheduling for upstream LLM calls."""
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import AsyncIterator, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+from ..cache import TTLCache
+
+# Set per request by get_current_user so LLM calls are attributed to the user
+current_user_id: ContextVar[Optional[int]] = ContextVar("current_user_id", default=None)
+
+
+class Priority(IntEnum):
+    """Request classes, most urgent first."""
+    INTERACTIVE = 0
+    GRADING = 1
+    GENERATION = 2
+    BACKGROUND = 3
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a user has used up their LLM call allowance."""
+
+    def __init__(self, retry_after: float, message: Optional[str] = None):
+        super().__init__(message or f"LLM rate limit exceeded, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.updated_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Bounded-concurrency gate in front of the LLM provider.
+
+    Waiting calls are served strictly by priority class. Within a class,
+    users take turns through weighted fair queuing, so one user's burst of
+    calls cannot delay everyone else's. A few slots are kept for interactive
+    calls so background work never occupies all of them, and each user is
+    limited to rate_limit_per_minute upstream calls.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        interactive_reserved: int = 2,
+        rate_limit_per_minute: int = 60
+    ):
+        self.max_concurrency = max_concurrency
+        self.background_limit = max(max_concurrency - interactive_reserved, 1)
+        self.rate_limit_per_minute = rate_limit_per_minute
+
+        self._active: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._queues: Dict[Priority, List[Tuple[float, int, asyncio.Future]]] = {p: [] for p in Priority}
+        self._virtual_time: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self._finish_tags: Dict[Priority, Dict[Hashable, float]] = {p: {} for p in Priority}
+        self._seq = itertools.count()
+        # Idle buckets are full again after a minute, so they can simply expire
+        self._buckets = TTLCache(maxsize=100_000, ttl=60)
+
+        self._dispatched: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._wait_seconds: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, user_id: Optional[int] = None) -> AsyncIterator[None]:
+        """Hold one upstream call slot for the duration of the block."""
+        await self.acquire(priority, user_id)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    async def acquire(self, priority: Priority, user_id: Optional[int] = None) -> None:
+        """Wait for an upstream call slot; pair with release()."""
+        self._take_token(user_id)
+        await self._acquire(priority, user_id)
+
+    def try_acquire(self, priority: Priority) -> bool:
+        """Take a slot only if one is free with nobody waiting ahead; pair with release()."""
+        if any(self._queues[p] for p in Priority if p <= priority) or not self._has_capacity(priority):
+            return False
+        self._active[priority] += 1
+        self._dispatched[priority] += 1
+        return True
+
+    def release(self, priority: Priority) -> None:
+        self._active[priority] -= 1
+        self._dispatch()
+
+    def _take_token(self, user_id: Optional[int]) -> None:
+        if user_id is None or self.rate_limit_per_minute <= 0:
+            return
+
+        rate = self.rate_limit_per_minute / 60
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_limit_per_minute)
+        else:
+            now = time.monotonic()
+            bucket.tokens = min(self.rate_limit_per_minute, bucket.tokens + (now - bucket.updated_at) * rate)
+            bucket.updated_at = now
+
+        if bucket.tokens < 1:
+            self.rejected += 1
+            raise RateLimitExceeded(math.ceil((1 - bucket.tokens) / rate))
+
+        bucket.tokens -= 1
+        self._buckets.set(user_id, bucket)
+
+    def _has_capacity(self, priority: Priority) -> bool:
+        active = sum(self._active.values())
+        if active >= self.max_concurrency:
+            return False
+        if priority == Priority.INTERACTIVE:
+            return True
+        return active - self._active[Priority.INTERACTIVE] < self.background_limit
+
+    async def _acquire(self, priority: Priority, user_id: Optional[int]) -> None:
+        if not any(self._queues[p] for p in Priority if p <= priority) and self._has_capacity(priority):
+            self._active[priority] += 1
+            self._dispatched[priority] += 1
+            return
+
+        # Finish tag: one unit of work after the later of now and the user's previous call
+        finish_tags = self._finish_tags[priority]
+        tag = max(self._virtual_time[priority], finish_tags.get(user_id, 0.0)) + 1
+        finish_tags[user_id] = tag
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[priority], (tag, next(self._seq), future))
+        self._dispatch()
+
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as we were cancelled
+                self.release(priority)
+            else:
+                future.cancel()
+            raise
+        self._wait_seconds[priority] += time.monotonic() - started
+
+    def _dispatch(self) -> None:
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue:
+                # Cancelled waiters are dropped lazily
+                if queue[0][2].done():
+                    heapq.heappop(queue)
+                    continue
+                if not self._has_capacity(priority):
+                    break
+
+                tag, _, future = heapq.heappop(queue)
+                self._virtual_time[priority] = tag
+                self._active[priority] += 1
+                self._dispatched[priority] += 1
+                future.set_result(None)
+
+            if not queue and self._finish_tags[priority]:
+                # Every flow of an idle class is caught up with its virtual time
+                self._finish_tags[priority].clear()
+            if sum(self._active.values()) >= self.max_concurrency:
+                return
+
+    def stats(self) -> dict:
+        """Active and queued calls plus average queue wait per priority class."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rate_limited": self.rejected,
+            "classes": {
+                priority.name.lower(): {
+                    "active": self._active[priority],
+                    "queued": sum(1 for _, _, future in self._queues[priority] if not future.done()),
+                    "dispatched": self._dispatched[priority],
+                    "avg_wait_ms": round(
+                        1000 * self._wait_seconds[priority] / self._dispatched[priority], 2
+                    ) if self._dispatched[priority] else 0.0
+                }
+                for priority in Priority
+            }
+        }
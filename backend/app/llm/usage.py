@@ -0,0 +1,166 @@
+"""Per-user LLM token usage ledger and daily quota."""
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..cache import TTLCache
+from ..database import sessionmanager
+from ..models.db_models import LLMUsage
+from .scheduler import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Usage is keyed by (user_id, day, call_site); user 0 is background work
+UsageKey = Tuple[int, date, str]
+
+
+class QuotaExceeded(RateLimitExceeded):
+    """Raised when a user has used up their daily LLM token quota."""
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def seconds_until_tomorrow() -> float:
+    now = datetime.now(timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+    return (tomorrow - now).total_seconds()
+
+
+class UsageLedger:
+    """Accumulates token usage in memory and writes it to llm_usage in batches.
+
+    Each flush adds the counters gathered since the last one to the
+    per-user, per-day rows, so the database sees one write per active
+    (user, call site) per interval instead of one per LLM call. Today's
+    totals per user are kept in memory for the quota check.
+    """
+
+    def __init__(self, flush_interval: float = 10, daily_quota: int = 0):
+        self.flush_interval = flush_interval
+        self.daily_quota = daily_quota
+        self._pending: Dict[UsageKey, List[int]] = {}
+        self._today = TTLCache(maxsize=100_000, ttl=86400)
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    def record(self, user_id: Optional[int], call_site: str, prompt_tokens: int, completion_tokens: int) -> None:
+        day = utc_today()
+        counters = self._pending.setdefault((user_id or 0, day, call_site), [0, 0, 0])
+        counters[0] += 1
+        counters[1] += prompt_tokens
+        counters[2] += completion_tokens
+
+        if user_id:
+            used = self._today.get(user_id)
+            if used and used[0] == day:
+                used[1] += prompt_tokens + completion_tokens
+
+    def pending(self, user_id: int) -> Dict[UsageKey, List[int]]:
+        """Counters for a user that have not been flushed yet."""
+        return {key: list(counters) for key, counters in self._pending.items() if key[0] == user_id}
+
+    async def used_today(self, user_id: int) -> int:
+        """Tokens the user has used today, flushed or not."""
+        day = utc_today()
+        used = self._today.get(user_id)
+        if used and used[0] == day:
+            return used[1]
+
+        async with sessionmanager.read_session() as db:
+            result = await db.execute(
+                select(func.coalesce(func.sum(LLMUsage.prompt_tokens + LLMUsage.completion_tokens), 0))
+                .where(LLMUsage.user_id == user_id, LLMUsage.day == day)
+            )
+            total = result.scalar() or 0
+        total += sum(c[1] + c[2] for key, c in self._pending.items() if key[0] == user_id and key[1] == day)
+        self._today.set(user_id, [day, total])
+        return total
+
+    async def check_quota(self, user_id: Optional[int]) -> None:
+        """Raise QuotaExceeded if the user has no tokens left today."""
+        if not self.daily_quota or not user_id:
+            return
+        if await self.used_today(user_id) >= self.daily_quota:
+            retry_after = seconds_until_tomorrow()
+            raise QuotaExceeded(retry_after, "Daily LLM token quota exceeded")
+
+    async def flush(self) -> None:
+        """Write pending counters to the database."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            try:
+                await self._write(batch)
+            except IntegrityError:
+                # Another process inserted one of the rows first; now they all exist
+                await self._write(batch)
+        except Exception as e:
+            logger.error(f"LLM usage flush failed, keeping {len(batch)} rows for the next one: {e}")
+            for key, counters in batch.items():
+                pending = self._pending.setdefault(key, [0, 0, 0])
+                for i, value in enumerate(counters):
+                    pending[i] += value
+            return
+        self.flushes += 1
+        self.flushed_rows += len(batch)
+
+    async def _write(self, batch: Dict[UsageKey, List[int]]) -> None:
+        async with sessionmanager.session() as db:
+            for (user_id, day, call_site), (calls, prompt_tokens, completion_tokens) in batch.items():
+                result = await db.execute(
+                    update(LLMUsage)
+                    .where(
+                        LLMUsage.user_id == user_id,
+                        LLMUsage.day == day,
+                        LLMUsage.call_site == call_site
+                    )
+                    .values(
+                        calls=LLMUsage.calls + calls,
+                        prompt_tokens=LLMUsage.prompt_tokens + prompt_tokens,
+                        completion_tokens=LLMUsage.completion_tokens + completion_tokens
+                    )
+                )
+                if result.rowcount == 0:
+                    db.add(LLMUsage(
+                        user_id=user_id,
+                        day=day,
+                        call_site=call_site,
+                        calls=calls,
+                        prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens
+                    ))
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_rows": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "daily_token_quota": self.daily_quota
+        }
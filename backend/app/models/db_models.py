@@ -1,5 +1,5 @@
 """SQLAlchemy database models."""
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, Date, DateTime, ForeignKey, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -28,6 +28,9 @@ class User(Base):
 class Conversation(Base):
     """Conversation model."""
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index("ix_conversations_user_updated", "user_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -35,7 +38,11 @@ class Conversation(Base):
     title = Column(String(200), default="New Conversation")
     topic = Column(String(100))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    
+    # Rolling summary of turns that no longer fit in the prompt budget
+    summary = Column(Text)
+    summary_message_id = Column(Integer)  # Newest message folded into summary
     
     # Relationships
     user = relationship("User", back_populates="conversations")
@@ -44,23 +51,53 @@ class Conversation(Base):
 class Message(Base):
     """Message model."""
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
     
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
+    token_count = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
 
+class ProblemBank(Base):
+    """Generated practice problem shared across users, deduplicated by content."""
+    __tablename__ = "problem_bank"
+    __table_args__ = (
+        Index("ix_problem_bank_lookup", "topic_key", "difficulty", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    topic = Column(String(100), nullable=False)
+    topic_key = Column(String(100), nullable=False)  # Normalized topic
+    difficulty = Column(String(20), nullable=False)
+    content_hash = Column(String(64), unique=True, nullable=False)
+    
+    problem_text = Column(Text, nullable=False)
+    hints = Column(JSON)
+    solution = Column(Text)
+    explanation = Column(Text)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class PracticeSession(Base):
     """Practice session model."""
     __tablename__ = "practice_sessions"
+    __table_args__ = (
+        Index("ix_practice_sessions_user_problem", "user_id", "problem_id"),
+        Index("ix_practice_sessions_problem", "problem_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    problem_id = Column(Integer, ForeignKey("problem_bank.id"))
     
     topic = Column(String(100), nullable=False)
     difficulty = Column(String(20), nullable=False)  # easy, medium, hard
@@ -83,3 +120,44 @@ class PracticeSession(Base):
     
     # Relationships
     user = relationship("User", back_populates="practice_sessions")
+
+class UserStats(Base):
+    """Per-user learning statistics rollup, maintained on write."""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    
+    total_conversations = Column(Integer, default=0, nullable=False)
+    total_practice_sessions = Column(Integer, default=0, nullable=False)
+    practice_sessions_completed = Column(Integer, default=0, nullable=False)
+    score_sum = Column(Float, default=0.0, nullable=False)
+    score_count = Column(Integer, default=0, nullable=False)
+    topics_practiced = Column(JSON)
+    recent_activity = Column(JSON)  # Newest first, capped at recent_activity_limit
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class UserTopicStats(Base):
+    """Per-user, per-topic practice aggregates, maintained on write."""
+    __tablename__ = "user_topic_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    topic = Column(String(100), primary_key=True)
+    
+    attempts = Column(Integer, default=0, nullable=False)
+    completions = Column(Integer, default=0, nullable=False)
+    score_sum = Column(Float, default=0.0, nullable=False)
+    score_count = Column(Integer, default=0, nullable=False)
+    last_practiced_at = Column(DateTime(timezone=True))
+
+class LLMUsage(Base):
+    """Per-user, per-day token usage for each LLM call site, written in batches."""
+    __tablename__ = "llm_usage"
+    
+    user_id = Column(Integer, primary_key=True)  # 0 for background work not made on a user's behalf
+    day = Column(Date, primary_key=True)
+    call_site = Column(String(50), primary_key=True)
+    
+    calls = Column(Integer, default=0, nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
@@ -1,7 +1,7 @@
 """Pydantic schemas."""
 from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import List, Optional, Literal
-from datetime import datetime
+from datetime import date, datetime
 
 # Auth schemas
 
@@ -24,6 +24,20 @@ class UserRegister(BaseModel):
             raise ValueError('Password must contain digit')
         return v
 
+class UserImportResult(BaseModel):
+    """One line of a bulk user import report."""
+    row: int
+    status: Literal["created", "exists", "invalid"]
+    username: Optional[str] = None
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class UserImportSummary(BaseModel):
+    """Last line of a bulk user import report."""
+    created: int = 0
+    exists: int = 0
+    invalid: int = 0
+
 class UserLogin(BaseModel):
     """User login."""
     username: str
@@ -42,6 +56,21 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class Principal(BaseModel):
+    """Signed-in user, cached between requests; read-only."""
+    id: int
+    username: str
+    email: str
+    full_name: str
+    learning_goals: Optional[str]
+    preferred_topics: Optional[List[str]]
+    created_at: datetime
+    is_active: bool
+    
+    class Config:
+        from_attributes = True
+        frozen = True
+
 class Token(BaseModel):
     """JWT token."""
     access_token: str
@@ -55,6 +84,10 @@ class UserUpdate(BaseModel):
     learning_goals: Optional[str] = None
     preferred_topics: Optional[List[str]] = None
 
+class UserActiveUpdate(BaseModel):
+    """Admin activation change."""
+    is_active: bool
+
 # Conversation schemas
 
 class MessageCreate(BaseModel):
@@ -83,6 +116,8 @@ class ConversationResponse(BaseModel):
     topic: Optional[str]
     created_at: datetime
     message_count: int
+    updated_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
 
 class ConversationDetailResponse(BaseModel):
     """Conversation with messages."""
@@ -91,6 +126,7 @@ class ConversationDetailResponse(BaseModel):
     topic: Optional[str]
     created_at: datetime
     messages: List[MessageResponse]
+    has_more: bool = False  # More messages beyond this page in the paging direction
 
 # Practice schemas
 
@@ -100,6 +136,12 @@ class ProblemGenerateRequest(BaseModel):
     difficulty: Literal["easy", "medium", "hard"]
     problem_type: Optional[str] = None  # "multiple-choice", "coding", "explanation"
 
+class ProblemBatchGenerateRequest(BaseModel):
+    """Generate a set of practice problems."""
+    topic: str = Field(..., min_length=2, max_length=100)
+    difficulty: Literal["easy", "medium", "hard"]
+    count: int = Field(5, ge=1, le=20)
+
 class ProblemResponse(BaseModel):
     """Generated problem."""
     problem_text: str
@@ -146,6 +188,21 @@ class LearningStats(BaseModel):
     recent_activity: List[dict]
     progress_by_topic: dict
 
+class UsageEntry(BaseModel):
+    """LLM token usage for one day and call site."""
+    day: date
+    call_site: str
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+
+class UsageResponse(BaseModel):
+    """LLM token usage and the remaining daily quota."""
+    used_today: int
+    daily_quota: Optional[int] = None
+    remaining_today: Optional[int] = None
+    usage: List[UsageEntry]
+
 # ============================================================================
 # UTILITY SCHEMAS
 # ============================================================================
@@ -1,20 +1,172 @@
 """Authentication service."""
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 from jose import JWTError, jwt
+import asyncio
 import bcrypt
+import threading
+import time
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 import logging
 
+from ..cache import TTLCache
+from ..database import sessionmanager
 from ..models.db_models import User
-from ..models.schemas import UserRegister
+from ..models.schemas import Principal, UserRegister
 from ..config import get_settings
+from .stats_service import StatsService
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already waiting."""
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded thread pool, off the event loop.
+
+    bcrypt releases the GIL, so hashes run in parallel on the workers
+    while the event loop keeps serving other requests. Once max_pending
+    hashes are running or queued, new ones are rejected at once instead
+    of queueing behind a login storm.
+    """
+    
+    def __init__(self, workers: int = 4, max_pending: int = 64):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+    
+    def _done(self, _) -> None:
+        with self._lock:
+            self._pending -= 1
+    
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        
+        # The slot is freed when the hash finishes, even if the caller has gone
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+    
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+    
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_password_hasher: Optional[PasswordHasher] = None
+
+def get_password_hasher() -> PasswordHasher:
+    global _password_hasher
+    if _password_hasher is None:
+        _password_hasher = PasswordHasher(
+            workers=settings.password_hash_workers,
+            max_pending=settings.password_hash_max_pending
+        )
+    return _password_hasher
+
+def close_password_hasher() -> None:
+    global _password_hasher
+    if _password_hasher is not None:
+        _password_hasher.shutdown()
+        _password_hasher = None
+
+
+class PrincipalCache:
+    """Decoded tokens and signed-in users, so authenticated requests skip the user query.
+    
+    Tokens are decoded once and kept until they expire. Users are kept for
+    ttl seconds; changes made in this process drop the entry at once, other
+    processes see them when it expires. A ttl of 0 disables the cache.
+    """
+    
+    def __init__(self, ttl: float = 60, maxsize: int = 10000):
+        self.ttl = ttl
+        self._tokens = TTLCache(maxsize=maxsize)
+        self._principals = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._invalidations = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def subject(self, token: str) -> str:
+        """Username the token was issued to; raises 401 for bad tokens."""
+        if self.ttl:
+            username = self._tokens.get(token)
+            if username is not None:
+                return username
+        
+        payload = AuthService.decode_token(token)
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        
+        if self.ttl and payload.get("exp"):
+            self._tokens.set(token, username, ttl=payload["exp"] - time.time())
+        return username
+    
+    async def principal(self, username: str) -> Optional[Principal]:
+        """Active user with this username, from the cache or the database."""
+        principal = self._principals.get(username) if self.ttl else None
+        if principal is not None:
+            self.hits += 1
+            return principal
+        
+        self.misses += 1
+        invalidations = self._invalidations
+        async with sessionmanager.read_session() as db:
+            user = await AuthService.get_user_by_username(db, username)
+            if not user or not user.is_active:
+                return None
+            principal = Principal.model_validate(user)
+        
+        # Skip caching if the user changed while it was being loaded
+        if self.ttl and invalidations == self._invalidations:
+            self._principals.set(username, principal)
+        return principal
+    
+    def invalidate(self, username: str) -> None:
+        """Drop a user after a profile change or deactivation."""
+        self._invalidations += 1
+        self._principals.pop(username)
+    
+    def stats(self) -> dict:
+        return {
+            "users": len(self._principals),
+            "tokens": len(self._tokens),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+_principal_cache: Optional[PrincipalCache] = None
+
+def get_principal_cache() -> PrincipalCache:
+    global _principal_cache
+    if _principal_cache is None:
+        _principal_cache = PrincipalCache(
+            ttl=settings.auth_cache_ttl_seconds,
+            maxsize=settings.auth_cache_size
+        )
+    return _principal_cache
+
 
 class AuthService:
     """Authentication service."""
@@ -23,7 +175,7 @@ class AuthService:
     def hash_password(password: str) -> str:
         """Hash password using bcrypt."""
         password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(settings.password_hash_rounds)
         return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
     
     @staticmethod
@@ -31,6 +183,16 @@ class AuthService:
         """Verify password against hash."""
         return bcrypt.checkpw(plain.encode('utf-8'), hashed.encode('utf-8'))
     
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Hash password on the password hasher pool."""
+        return await get_password_hasher().run(AuthService.hash_password, password)
+    
+    @staticmethod
+    async def verify_password_async(plain: str, hashed: str) -> bool:
+        """Verify password on the password hasher pool."""
+        return await get_password_hasher().run(AuthService.verify_password, plain, hashed)
+    
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
         to_encode = data.copy()
@@ -53,16 +215,21 @@ class AuthService:
             raise HTTPException(status_code=400, detail="Email already exists")
         
         # Create user
+        hashed_password = await AuthService.hash_password_async(user_data.password)
         db_user = User(
             username=user_data.username,
             email=user_data.email,
             full_name=user_data.full_name,
-            hashed_password=AuthService.hash_password(user_data.password),
+            hashed_password=hashed_password,
             learning_goals=user_data.learning_goals,
             preferred_topics=[]
         )
         
         db.add(db_user)
+        await db.flush()
+        
+        # Start the stats rollup in the same transaction
+        db.add(StatsService.new_rollup(db_user.id))
         await db.commit()
         await db.refresh(db_user)
         
@@ -74,7 +241,7 @@ class AuthService:
         result = await db.execute(select(User).where(User.username == username))
         user = result.scalar_one_or_none()
         
-        if not user or not AuthService.verify_password(password, user.hashed_password):
+        if not user or not await AuthService.verify_password_async(password, user.hashed_password):
             return None
         
         return user
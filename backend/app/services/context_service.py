@@ -0,0 +1,138 @@
+"""Conversation context service."""
+from sqlalchemy import select, update, func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Set, Tuple
+import logging
+
+from ..config import get_settings
+from ..database import sessionmanager
+from ..models.db_models import Conversation, Message
+from ..utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Conversations whose rolling summary is being rebuilt right now
+_summaries_in_progress: Set[int] = set()
+
+
+class ContextService:
+    """Builds token-budgeted prompt history for conversations."""
+
+    @staticmethod
+    async def _recent_window(db: AsyncSession, conv_id: int) -> Tuple[Optional[int], Optional[int]]:
+        """Get the oldest message id inside the prompt window and the newest one left out."""
+        # Room is always reserved for the summary so the window does not
+        # shift when the summary is rebuilt.
+        budget = max(0, settings.context_token_budget - settings.llm_routes["summary"].max_tokens)
+
+        # Size the window from token counts only; bodies are loaded afterwards
+        tokens = func.coalesce(Message.token_count, func.length(Message.content) / 4 + 1)
+        result = await db.execute(
+            select(Message.id, tokens)
+            .where(Message.conversation_id == conv_id)
+            .order_by(desc(Message.id))
+            .limit(settings.context_max_messages + 1)
+        )
+
+        used = 0
+        first_id = None
+        for index, (msg_id, msg_tokens) in enumerate(result.all()):
+            if index == settings.context_max_messages or used + msg_tokens > budget:
+                return first_id, msg_id
+            used += msg_tokens
+            first_id = msg_id
+
+        return first_id, None
+
+    @staticmethod
+    async def build_context(db: AsyncSession, conv: Conversation) -> Tuple[List[dict], bool]:
+        """Build prompt history for a conversation.
+
+        Returns the history messages and whether the rolling summary is
+        behind and should be refreshed in the background.
+        """
+        first_id, excluded_id = await ContextService._recent_window(db, conv.id)
+
+        history = []
+        if conv.summary:
+            history.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{conv.summary}"
+            })
+
+        if first_id is not None:
+            result = await db.execute(
+                select(Message.role, Message.content)
+                .where(Message.conversation_id == conv.id, Message.id >= first_id)
+                .order_by(Message.id)
+            )
+            history.extend({"role": role, "content": content} for role, content in result.all())
+
+        needs_summary = excluded_id is not None and excluded_id > (conv.summary_message_id or 0)
+        return history, needs_summary
+
+    @staticmethod
+    async def refresh_summary(conv_id: int) -> None:
+        """Fold turns that fell out of the prompt window into the rolling summary."""
+        if conv_id in _summaries_in_progress:
+            return
+        _summaries_in_progress.add(conv_id)
+
+        # Imported here to keep services free of agent imports at module load
+        from ..agents.tutor_agent import get_tutor_agent
+
+        try:
+            # No connection is held across the LLM calls; the write pool is small
+            async with sessionmanager.read_session() as db:
+                conv = await db.get(Conversation, conv_id)
+                if not conv:
+                    return
+
+                _, excluded_id = await ContextService._recent_window(db, conv_id)
+                summarized_id = conv.summary_message_id or 0
+                if excluded_id is None or excluded_id <= summarized_id:
+                    return
+
+                summary = conv.summary
+                result = await db.execute(
+                    select(Message.role, Message.content)
+                    .where(
+                        Message.conversation_id == conv_id,
+                        Message.id > summarized_id,
+                        Message.id <= excluded_id
+                    )
+                    .order_by(Message.id)
+                )
+                messages = result.all()
+
+            # Fold in budget-sized chunks so each summary prompt stays bounded
+            agent = get_tutor_agent()
+            chunk = []
+            chunk_tokens = 0
+            for role, content in messages:
+                tokens = estimate_tokens(content)
+                if chunk and chunk_tokens + tokens > settings.context_token_budget:
+                    summary = await agent.summarize(summary, chunk)
+                    chunk, chunk_tokens = [], 0
+                chunk.append({"role": role, "content": content})
+                chunk_tokens += tokens
+            if chunk:
+                summary = await agent.summarize(summary, chunk)
+
+            async with sessionmanager.session() as db:
+                await db.execute(
+                    update(Conversation)
+                    .where(
+                        Conversation.id == conv_id,
+                        func.coalesce(Conversation.summary_message_id, 0) == summarized_id
+                    )
+                    # Keep the conversation's place in the list; this is not new activity
+                    .values(summary=summary, summary_message_id=excluded_id, updated_at=Conversation.updated_at)
+                )
+
+            logger.info(f"Conversation {conv_id} summary updated through message {excluded_id}")
+        except Exception as e:
+            logger.error(f"Summary refresh failed for conversation {conv_id}: {e}")
+        finally:
+            _summaries_in_progress.discard(conv_id)
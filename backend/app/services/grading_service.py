@@ -0,0 +1,193 @@
+"""Answer grading service."""
+from typing import List, Optional, Tuple
+import logging
+import math
+import re
+
+from ..models.db_models import PracticeSession
+from ..models.schemas import AnswerFeedback
+
+logger = logging.getLogger(__name__)
+
+MAX_VERIFIABLE_LENGTH = 80
+
+NUMBER_RE = re.compile(r'^[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?$')
+THOUSANDS_RE = re.compile(r'^[-+]?\d{1,3}(,\d{3})+(\.\d+)?$')
+FRACTION_RE = re.compile(r'^([-+]?\d+)\s*/\s*(\d+)$')
+CHOICE_RE = re.compile(r'^(?:option|choice|answer)?\s*\(?([a-h])\)?[.:]?$', re.IGNORECASE)
+ANSWER_RE = re.compile(
+    r'(final answer|answer|result)\s*(?:is|:|=)\s*(.+?)(?:\.(?=\s)|\.?\s*$)',
+    re.IGNORECASE | re.MULTILINE
+)
+BRACKETS = {'[': ']', '(': ')', '{': '}'}
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, collapse whitespace and strip quotes and trailing punctuation."""
+    text = text.strip().strip('`"\'').strip()
+    text = re.sub(r'\s+', ' ', text).lower()
+    return text.rstrip('.!').strip()
+
+
+def _to_number(text: str) -> Optional[float]:
+    value = _normalize(text).replace(' ', '')
+    percent = value.endswith('%')
+    value = value.rstrip('%')
+
+    if THOUSANDS_RE.match(value):
+        value = value.replace(',', '')
+
+    if NUMBER_RE.match(value):
+        number = float(value)
+    else:
+        match = FRACTION_RE.match(value)
+        if not match or int(match.group(2)) == 0:
+            return None
+        number = int(match.group(1)) / int(match.group(2))
+
+    return number / 100 if percent else number
+
+
+def _to_choice(text: str) -> Optional[str]:
+    match = CHOICE_RE.match(_normalize(text))
+    return match.group(1).lower() if match else None
+
+
+def _to_collection(text: str) -> Optional[Tuple[List[str], bool]]:
+    """Parse a flat [...], (...) or {...} literal into normalized items and whether order matters.
+
+    Anything else with commas in it (prose, calls, signatures) is left to
+    the LLM.
+    """
+    value = text.strip().rstrip('.')
+    if len(value) < 2 or BRACKETS.get(value[0]) != value[-1]:
+        return None
+
+    inner = value[1:-1]
+    if any(char in inner for char in '[](){}'):
+        return None
+
+    items = [_normalize(item) for item in inner.split(',') if item.strip()]
+    return items, value[0] != '{'
+
+
+def _same_item(a: str, b: str) -> bool:
+    num_a, num_b = _to_number(a), _to_number(b)
+    if num_a is not None and num_b is not None:
+        return math.isclose(num_a, num_b, rel_tol=1e-6, abs_tol=1e-9)
+    return a == b
+
+
+def _compare(answer: str, expected: str) -> Optional[bool]:
+    """Compare an answer with an expected value; None when not decidable locally."""
+    num_answer, num_expected = _to_number(answer), _to_number(expected)
+    if num_answer is not None and num_expected is not None:
+        return math.isclose(num_answer, num_expected, rel_tol=1e-6, abs_tol=1e-9)
+
+    choice_answer, choice_expected = _to_choice(answer), _to_choice(expected)
+    if choice_answer and choice_expected:
+        return choice_answer == choice_expected
+
+    coll_answer, coll_expected = _to_collection(answer), _to_collection(expected)
+    if coll_answer and coll_expected:
+        items_answer, items_expected = coll_answer[0], coll_expected[0]
+        if len(items_answer) != len(items_expected):
+            return False
+        if coll_expected[1]:
+            return all(_same_item(a, b) for a, b in zip(items_answer, items_expected))
+        remaining = list(items_expected)
+        for item in items_answer:
+            match = next((i for i, e in enumerate(remaining) if _same_item(item, e)), None)
+            if match is None:
+                return False
+            remaining.pop(match)
+        return True
+
+    if _normalize(answer) == _normalize(expected):
+        return True
+
+    # Free text that does not match exactly needs a judgement call
+    return None
+
+
+def _is_verifiable(text: str) -> bool:
+    return (
+        _to_number(text) is not None
+        or _to_choice(text) is not None
+        or _to_collection(text) is not None
+    )
+
+
+class GradingService:
+    """Grades practice answers, calling the LLM only when local checks are inconclusive."""
+
+    @staticmethod
+    def expected_answers(solution: Optional[str]) -> List[str]:
+        """Extract short expected answers from a stored solution."""
+        if not solution:
+            return []
+
+        solution = solution.strip()
+        candidates = []
+
+        if len(solution) <= MAX_VERIFIABLE_LENGTH and '\n' not in solution:
+            candidates.append(solution)
+
+        # Earlier "answer is" phrases may describe wrong answers; trust the
+        # last one, or the last explicit final answer
+        matches = list(ANSWER_RE.finditer(solution))
+        final = [match for match in matches if match.group(1).lower() == "final answer"]
+        if final or matches:
+            value = (final or matches)[-1].group(2).strip()
+            if len(value) <= MAX_VERIFIABLE_LENGTH:
+                candidates.append(value)
+
+        last_line = solution.splitlines()[-1].strip()
+        if len(last_line) <= MAX_VERIFIABLE_LENGTH and _is_verifiable(last_line):
+            candidates.append(last_line)
+
+        return list(dict.fromkeys(candidates))
+
+    @staticmethod
+    def grade_locally(answer: str, solution: Optional[str]) -> Optional[AnswerFeedback]:
+        """Grade with deterministic checks, or return None if they are inconclusive."""
+        candidates = GradingService.expected_answers(solution)
+        verdicts = [(candidate, _compare(answer, candidate)) for candidate in candidates]
+
+        decided = [(candidate, verdict) for candidate, verdict in verdicts if verdict is not None]
+        if not decided:
+            return None
+
+        # Candidates that disagree mean the solution was misread; let the LLM judge
+        if len({verdict for _, verdict in decided}) > 1:
+            return None
+
+        candidate, verdict = decided[0]
+        if verdict:
+            return AnswerFeedback(
+                is_correct=True,
+                score=100.0,
+                feedback=f"Correct! The expected answer is {candidate}.",
+                solution=solution
+            )
+
+        # A mismatch is only conclusive when both sides are checkable values
+        return AnswerFeedback(
+            is_correct=False,
+            score=0.0,
+            feedback=f"Not quite. The expected answer is {candidate}. Review the solution and try a similar problem.",
+            solution=solution
+        )
+
+    @staticmethod
+    async def grade(session: PracticeSession, answer: str) -> AnswerFeedback:
+        """Grade an answer to a practice session's problem."""
+        local = GradingService.grade_locally(answer, session.solution)
+        if local:
+            return local
+
+        # Imported here to keep services free of agent imports at module load
+        from ..agents.tutor_agent import get_tutor_agent
+
+        graded = await get_tutor_agent().grade(session.problem_text, session.solution, answer)
+        return AnswerFeedback(**graded.model_dump(), solution=session.solution)
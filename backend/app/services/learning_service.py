@@ -1,22 +1,28 @@
 """Learning service."""
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, update, func, desc, and_, or_, String, type_coerce
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import logging
 import time
 
-from ..models.db_models import Conversation, Message, PracticeSession
+from ..models.db_models import Conversation, Message, PracticeSession, ProblemBank
 from ..models.schemas import *
+from .stats_service import StatsService
+from ..utils import estimate_tokens, truncate_string, encode_cursor, decode_cursor
 
 logger = logging.getLogger(__name__)
 
+PREVIEW_LENGTH = 120
+
 class LearningService:
     """Learning service."""
     
     @staticmethod
     async def create_conversation(db: AsyncSession, user_id: int, title: Optional[str] = None) -> Conversation:
         """Create new conversation."""
+        await StatsService.record_conversation_created(db, user_id, title or "New Conversation")
+        
         conv = Conversation(
             user_id=user_id,
             title=title or "New Conversation"
@@ -27,15 +33,88 @@ class LearningService:
         return conv
     
     @staticmethod
-    async def get_user_conversations(db: AsyncSession, user_id: int) -> List[Conversation]:
-        """Get user conversations with message count."""
-        result = await db.execute(
-            select(Conversation)
-            .options(selectinload(Conversation.messages))
+    async def get_user_conversations(
+        db: AsyncSession,
+        user_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Get a page of user conversations with message count and preview.
+        
+        Conversations are ordered newest first by (updated_at, id); pass the
+        returned cursor back to fetch the next page. Raises ValueError for a
+        malformed cursor.
+        """
+        # Keyset on the stored value so cursor round-trips compare exactly;
+        # ordering by the bare column lets ix_conversations_user_updated serve it
+        sort_key = type_coerce(Conversation.updated_at, String)
+        
+        query = (
+            select(
+                Conversation.id,
+                Conversation.title,
+                Conversation.topic,
+                Conversation.created_at,
+                Conversation.updated_at,
+                sort_key.label("sort_key")
+            )
             .where(Conversation.user_id == user_id)
-            .order_by(desc(Conversation.updated_at))
+            .order_by(desc(Conversation.updated_at), desc(Conversation.id))
+            .limit(limit + 1)
         )
-        return list(result.scalars().all())
+        
+        if cursor:
+            after_key, after_id = decode_cursor(cursor, 2)
+            query = query.where(or_(
+                sort_key < after_key,
+                and_(sort_key == after_key, Conversation.id < int(after_id))
+            ))
+        
+        rows = (await db.execute(query)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        conv_ids = [row.id for row in rows]
+        counts = {}
+        previews = {}
+        
+        if conv_ids:
+            # Count messages in SQL instead of loading them
+            result = await db.execute(
+                select(Message.conversation_id, func.count(Message.id), func.max(Message.id))
+                .where(Message.conversation_id.in_(conv_ids))
+                .group_by(Message.conversation_id)
+            )
+            last_ids = []
+            for conv_id, count, last_id in result.all():
+                counts[conv_id] = count
+                last_ids.append(last_id)
+            
+            if last_ids:
+                result = await db.execute(
+                    select(Message.conversation_id, func.substr(Message.content, 1, PREVIEW_LENGTH + 1))
+                    .where(Message.id.in_(last_ids))
+                )
+                previews = {
+                    conv_id: truncate_string(text, PREVIEW_LENGTH)
+                    for conv_id, text in result.all()
+                }
+        
+        items = [
+            {
+                "id": row.id,
+                "title": row.title,
+                "topic": row.topic,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at,
+                "message_count": counts.get(row.id, 0),
+                "last_message_preview": previews.get(row.id)
+            }
+            for row in rows
+        ]
+        
+        next_cursor = encode_cursor(rows[-1].sort_key, rows[-1].id) if has_more else None
+        return items, next_cursor
     
     @staticmethod
     async def get_conversation_with_messages(db: AsyncSession, conv_id: int, user_id: int) -> Optional[Conversation]:
@@ -47,6 +126,49 @@ class LearningService:
         )
         return result.scalar_one_or_none()
     
+    @staticmethod
+    async def get_conversation(db: AsyncSession, conv_id: int, user_id: int) -> Optional[Conversation]:
+        """Get conversation without loading its messages."""
+        result = await db.execute(
+            select(Conversation)
+            .where(Conversation.id == conv_id, Conversation.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+    
+    @staticmethod
+    async def get_messages_page(
+        db: AsyncSession,
+        conv_id: int,
+        limit: int = 50,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> Tuple[List[Message], bool]:
+        """Get a page of messages in chronological order.
+        
+        Without after_id the newest messages (older than before_id, if given)
+        are returned and the flag tells whether older ones remain. With
+        after_id the messages following it are returned and the flag tells
+        whether newer ones remain.
+        """
+        query = select(Message).where(Message.conversation_id == conv_id)
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        
+        if after_id is not None:
+            query = query.where(Message.id > after_id).order_by(Message.id)
+        else:
+            query = query.order_by(desc(Message.id))
+        
+        result = await db.execute(query.limit(limit + 1))
+        messages = list(result.scalars().all())
+        
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after_id is None:
+            messages.reverse()
+        
+        return messages, has_more
+    
     @staticmethod
     async def delete_conversation(db: AsyncSession, conv_id: int, user_id: int) -> bool:
         """Delete a conversation and its messages."""
@@ -59,6 +181,7 @@ class LearningService:
         if not conv:
             return False
         
+        await StatsService.record_conversation_deleted(db, user_id)
         await db.delete(conv)
         await db.commit()
         return True
@@ -69,9 +192,29 @@ class LearningService:
         message = Message(
             conversation_id=conv_id,
             role=role,
-            content=content
+            content=content,
+            token_count=estimate_tokens(content)
+        )
+        db.add(message)
+        await db.commit()
+        await db.refresh(message)
+        return message
+    
+    @staticmethod
+    async def add_reply(db: AsyncSession, conv_id: int, content: str) -> Message:
+        """Add the assistant's reply and bump the conversation's updated_at in one commit."""
+        message = Message(
+            conversation_id=conv_id,
+            role="assistant",
+            content=content,
+            token_count=estimate_tokens(content)
         )
         db.add(message)
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.id == conv_id)
+            .values(updated_at=func.now())
+        )
         await db.commit()
         await db.refresh(message)
         return message
@@ -84,11 +227,15 @@ class LearningService:
         difficulty: str,
         problem_text: str,
         hints: List[str],
-        solution: str
+        solution: str,
+        problem_id: Optional[int] = None
     ) -> PracticeSession:
         """Create practice session."""
+        await StatsService.record_practice_session_created(db, user_id, topic, difficulty)
+        
         session = PracticeSession(
             user_id=user_id,
+            problem_id=problem_id,
             topic=topic,
             difficulty=difficulty,
             problem_text=problem_text,
@@ -100,6 +247,41 @@ class LearningService:
         await db.refresh(session)
         return session
     
+    @staticmethod
+    async def create_practice_sessions(
+        db: AsyncSession,
+        user_id: int,
+        topic: str,
+        difficulty: str,
+        problems: List[ProblemBank]
+    ) -> List[PracticeSession]:
+        """Create one practice session per banked problem in a single transaction."""
+        sessions = []
+        for problem in problems:
+            await StatsService.record_practice_session_created(db, user_id, topic, difficulty)
+            sessions.append(PracticeSession(
+                user_id=user_id,
+                problem_id=problem.id,
+                topic=topic,
+                difficulty=difficulty,
+                problem_text=problem.problem_text,
+                hints=problem.hints,
+                solution=problem.solution
+            ))
+        
+        db.add_all(sessions)
+        await db.commit()
+        return sessions
+    
+    @staticmethod
+    async def get_practice_session(db: AsyncSession, session_id: int, user_id: int) -> Optional[PracticeSession]:
+        """Get a practice session owned by the user."""
+        result = await db.execute(
+            select(PracticeSession)
+            .where(PracticeSession.id == session_id, PracticeSession.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+    
     @staticmethod
     async def submit_practice_answer(
         db: AsyncSession,
@@ -120,6 +302,8 @@ class LearningService:
         if not session:
             raise ValueError("Session not found")
         
+        await StatsService.record_practice_answer(db, session, is_correct, score)
+        
         session.user_answer = answer
         session.is_correct = is_correct
         session.score = score
@@ -133,46 +317,4 @@ class LearningService:
     @staticmethod
     async def get_user_stats(db: AsyncSession, user_id: int) -> dict:
         """Get user learning statistics."""
-        # Total conversations
-        conv_result = await db.execute(
-            select(func.count(Conversation.id)).where(Conversation.user_id == user_id)
-        )
-        total_conversations = conv_result.scalar() or 0
-        
-        # Total practice sessions
-        practice_result = await db.execute(
-            select(func.count(PracticeSession.id)).where(PracticeSession.user_id == user_id)
-        )
-        total_practice = practice_result.scalar() or 0
-        
-        # Completed sessions
-        completed_result = await db.execute(
-            select(func.count(PracticeSession.id))
-            .where(PracticeSession.user_id == user_id, PracticeSession.is_correct.isnot(None))
-        )
-        completed = completed_result.scalar() or 0
-        
-        # Average score
-        avg_result = await db.execute(
-            select(func.avg(PracticeSession.score))
-            .where(PracticeSession.user_id == user_id, PracticeSession.score.isnot(None))
-        )
-        avg_score = float(avg_result.scalar() or 0.0)
-        
-        # Topics practiced
-        topics_result = await db.execute(
-            select(PracticeSession.topic)
-            .where(PracticeSession.user_id == user_id)
-            .distinct()
-        )
-        topics = [t[0] for t in topics_result.all()]
-        
-        return {
-            "total_conversations": total_conversations,
-            "total_practice_sessions": total_practice,
-            "practice_sessions_completed": completed,
-            "average_score": round(avg_score, 2),
-            "topics_practiced": topics,
-            "recent_activity": [],
-            "progress_by_topic": {}
-        }
+        return await StatsService.get_user_stats(db, user_id)
@@ -0,0 +1,109 @@
+"""Problem bank service."""
+from sqlalchemy import select, exists, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import hashlib
+import logging
+
+from ..agents.problem_generator import GeneratedProblem
+from ..database import conflict_insert
+from ..models.db_models import PracticeSession, ProblemBank
+from ..utils import normalize_topic
+
+logger = logging.getLogger(__name__)
+
+
+class ProblemBankService:
+    """Shared, deduplicated store of generated practice problems."""
+
+    @staticmethod
+    def content_hash(topic: str, difficulty: str, problem_text: str) -> str:
+        """Hash a problem within its topic and difficulty, ignoring case and whitespace differences."""
+        normalized = " ".join(problem_text.lower().split())
+        key = f"{normalize_topic(topic)}|{difficulty}|{normalized}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    async def select_unseen(
+        db: AsyncSession,
+        user_id: int,
+        topic: str,
+        difficulty: str
+    ) -> Optional[ProblemBank]:
+        """Get the oldest banked problem the user has not attempted yet."""
+        problems = await ProblemBankService.select_unseen_many(db, user_id, topic, difficulty, 1)
+        return problems[0] if problems else None
+
+    @staticmethod
+    async def select_unseen_many(
+        db: AsyncSession,
+        user_id: int,
+        topic: str,
+        difficulty: str,
+        limit: int
+    ) -> List[ProblemBank]:
+        """Get up to limit of the oldest banked problems the user has not attempted."""
+        attempted = (
+            select(PracticeSession.id)
+            .where(PracticeSession.user_id == user_id, PracticeSession.problem_id == ProblemBank.id)
+        )
+        result = await db.execute(
+            select(ProblemBank)
+            .where(
+                ProblemBank.topic_key == normalize_topic(topic),
+                ProblemBank.difficulty == difficulty,
+                ~exists(attempted)
+            )
+            .order_by(ProblemBank.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def count_unattempted(db: AsyncSession, topic: str, difficulty: str) -> int:
+        """Count banked problems no user has attempted yet."""
+        attempted = select(PracticeSession.id).where(PracticeSession.problem_id == ProblemBank.id)
+        result = await db.execute(
+            select(func.count())
+            .select_from(ProblemBank)
+            .where(
+                ProblemBank.topic_key == normalize_topic(topic),
+                ProblemBank.difficulty == difficulty,
+                ~exists(attempted)
+            )
+        )
+        return result.scalar_one()
+
+    @staticmethod
+    async def add_problem(
+        db: AsyncSession,
+        topic: str,
+        difficulty: str,
+        problem: GeneratedProblem
+    ) -> ProblemBank:
+        """Store a generated problem, returning the existing entry for duplicates.
+
+        Concurrent requests may bank the same problem; the insert skips
+        duplicates and everyone reads back the single stored row.
+        """
+        content_hash = ProblemBankService.content_hash(topic, difficulty, problem.problem_text)
+
+        await db.execute(
+            conflict_insert(db, ProblemBank)
+            .values(
+                topic=topic,
+                topic_key=normalize_topic(topic),
+                difficulty=difficulty,
+                content_hash=content_hash,
+                problem_text=problem.problem_text,
+                hints=problem.hints,
+                solution=problem.solution,
+                explanation=problem.explanation
+            )
+            .on_conflict_do_nothing(index_elements=["content_hash"])
+        )
+
+        result = await db.execute(
+            select(ProblemBank).where(ProblemBank.content_hash == content_hash)
+        )
+        return result.scalar_one()
@@ -0,0 +1,210 @@
+"""Recommendation service."""
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Set, Tuple
+import hashlib
+import logging
+import re
+
+from ..cache import TTLCache
+from ..config import get_settings
+from ..utils import truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+QUICK_TIPS = (
+    "Short, regular sessions beat long cramming sessions.",
+    "Explaining a concept in your own words is the fastest way to test it.",
+    "Mistakes are data: review the ones you made last time.",
+    "Mix topics in a session to make what you learn stick.",
+    "Try a problem before looking at the hints.",
+    "Small daily progress adds up quickly.",
+)
+
+# Latest LLM recommendation per (user, route), tagged with the stats fingerprint
+_llm_recommendations = TTLCache(
+    maxsize=settings.recommendation_cache_size,
+    ttl=settings.recommendation_cache_ttl_seconds
+)
+_refreshes_in_progress: Set[Tuple[int, str]] = set()
+
+
+class RecommendationService:
+    """Builds next-step recommendations from learning stats.
+
+    Recommendations come from deterministic rules; the LLM is only asked
+    again when a user's stats fingerprint changes, and its answer is then
+    served from cache for that user and route.
+    """
+
+    @staticmethod
+    def normalize_route(route: str) -> str:
+        """Strip query strings and ids so /chat/12 and /chat/15 share a cache entry."""
+        path = route.split('?', 1)[0].split('#', 1)[0].rstrip('/') or '/'
+        return re.sub(r'/\d+(?=/|$)', '/:id', path)
+
+    @staticmethod
+    def fingerprint(stats: dict) -> str:
+        """Summarize stats coarsely so only meaningful changes alter it."""
+        def bucket(n: int) -> int:
+            # 0, 1, 2-3, 4-7, 8-15, ...
+            return n.bit_length()
+
+        pending = stats['total_practice_sessions'] - stats['practice_sessions_completed']
+        parts = (
+            bucket(stats['total_conversations']),
+            bucket(stats['total_practice_sessions']),
+            bucket(stats['practice_sessions_completed']),
+            int(stats['average_score'] // 10),
+            min(pending, 3),
+            tuple(sorted(stats['topics_practiced'][:5])),
+        )
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _recent_completions(stats: dict, window: timedelta) -> int:
+        """Count practice answers submitted within the window."""
+        since = (datetime.now(timezone.utc) - window).isoformat()
+        return sum(
+            1 for event in stats.get('recent_activity') or []
+            if event.get('type') == 'practice_completed' and event.get('timestamp', '') >= since
+        )
+
+    @staticmethod
+    def rule_based(user_id: int, route: str, stats: dict) -> dict:
+        """Build a recommendation from stats without calling the LLM."""
+        total = stats['total_practice_sessions']
+        completed = stats['practice_sessions_completed']
+        pending = total - completed
+        avg = stats['average_score']
+        topics = stats['topics_practiced']
+        progress = stats.get('progress_by_topic') or {}
+
+        day = datetime.now(timezone.utc).toordinal()
+        quick_tip = QUICK_TIPS[(user_id + day) % len(QUICK_TIPS)]
+
+        scored = [(p['average_score'], topic) for topic, p in progress.items() if p.get('completed')]
+        weakest = min(scored)[1] if scored else None
+
+        if total == 0 and stats['total_conversations'] == 0:
+            return {
+                "quick_tip": "Every expert started as a beginner.",
+                "suggestion": "Start with the basics: ask the AI tutor about a topic you want to learn, then try an easy practice problem.",
+                "estimated_time": "10 min",
+                "priority": "high",
+                "action_type": "learn",
+            }
+
+        if RecommendationService._recent_completions(stats, timedelta(hours=1)) >= 8:
+            return {
+                "quick_tip": "Rest helps your brain consolidate what you just practiced.",
+                "suggestion": "You have been practicing hard. Take a short break, then come back to review your answers.",
+                "estimated_time": "5 min",
+                "priority": "low",
+                "action_type": "break",
+            }
+
+        if pending > 0:
+            return {
+                "quick_tip": quick_tip,
+                "suggestion": f"You have {pending} unfinished practice problem{'s' if pending != 1 else ''}. Finish {'them' if pending != 1 else 'it'} to lock in what you learned.",
+                "estimated_time": "10 min" if pending < 3 else "20 min",
+                "priority": "medium",
+                "action_type": "practice",
+            }
+
+        if completed >= 3 and avg < 60 and weakest:
+            return {
+                "quick_tip": quick_tip,
+                "suggestion": f"Review {weakest}: your scores there are lowest. Ask the tutor to explain the concepts you missed, then retry an easy problem.",
+                "estimated_time": "15 min",
+                "priority": "high",
+                "action_type": "review",
+            }
+
+        if completed >= 5 and avg >= 85:
+            return {
+                "quick_tip": quick_tip,
+                "suggestion": "You are scoring consistently well. Challenge yourself with a harder difficulty or start a new topic.",
+                "estimated_time": "15 min",
+                "priority": "medium",
+                "action_type": "learn",
+            }
+
+        if route.startswith('/chat'):
+            suggestion = "Ask the tutor about anything that felt unclear in your last practice session."
+            action_type = "learn"
+        elif topics:
+            suggestion = f"Keep the momentum going with another {topics[-1]} problem, or try a topic you have not practiced yet."
+            action_type = "practice"
+        else:
+            suggestion = "Put what you learned in chat to work with an easy practice problem."
+            action_type = "practice"
+
+        return {
+            "quick_tip": quick_tip,
+            "suggestion": suggestion,
+            "estimated_time": "10 min",
+            "priority": "medium",
+            "action_type": action_type,
+        }
+
+    @staticmethod
+    def recommend(user_id: int, route: str, stats: dict) -> Tuple[dict, bool]:
+        """Get a recommendation for the user and route.
+
+        Returns the recommendation and whether an LLM refresh should be
+        scheduled because the cached one is missing or stale.
+        """
+        route = RecommendationService.normalize_route(route)
+        fingerprint = RecommendationService.fingerprint(stats)
+
+        cached = _llm_recommendations.get((user_id, route))
+        if cached and cached[0] == fingerprint:
+            return cached[1], False
+
+        needs_refresh = (
+            settings.recommendation_llm_enabled
+            and (user_id, route) not in _refreshes_in_progress
+        )
+        return RecommendationService.rule_based(user_id, route, stats), needs_refresh
+
+    @staticmethod
+    async def refresh_llm_recommendation(
+        user_id: int,
+        route: str,
+        stats: dict,
+        full_name: Optional[str],
+        learning_goals: Optional[str]
+    ) -> None:
+        """Ask the LLM for a recommendation and cache it under the stats fingerprint."""
+        route = RecommendationService.normalize_route(route)
+        key = (user_id, route)
+        if key in _refreshes_in_progress:
+            return
+        _refreshes_in_progress.add(key)
+
+        # Imported here to keep services free of agent imports at module load
+        from ..agents.tutor_agent import get_tutor_agent
+
+        try:
+            context = f"""
+User: {full_name}
+Current page: {route}
+Learning goals: {truncate_to_tokens(learning_goals, settings.prompt_field_max_tokens) or 'Not set'}
+Total conversations: {stats['total_conversations']}
+Practice sessions: {stats['total_practice_sessions']}
+Completed sessions: {stats['practice_sessions_completed']}
+Average score: {stats['average_score']:.1f}%
+Topics practiced: {truncate_to_tokens(', '.join(stats['topics_practiced'][:5]), settings.prompt_field_max_tokens) or 'None yet'}
+"""
+            recommendation = await get_tutor_agent().recommend(context)
+
+            _llm_recommendations.set(
+                key,
+                (RecommendationService.fingerprint(stats), recommendation.model_dump())
+            )
+        except Exception as e:
+            logger.error(f"LLM recommendation refresh failed: {e}")
+        finally:
+            _refreshes_in_progress.discard(key)
@@ -0,0 +1,363 @@
+"""Learning statistics service."""
+from datetime import datetime, timezone
+from sqlalchemy import select, func, delete, desc, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import logging
+
+from ..config import get_settings
+from ..database import conflict_insert, sessionmanager
+from ..models.db_models import Conversation, PracticeSession, User, UserStats, UserTopicStats
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class StatsService:
+    """Maintains the per-user and per-topic statistics rollups.
+
+    The record_* hooks run inside the caller's transaction and must be
+    called before the change itself is added to the session, so that a
+    rollup built from the source tables does not count it twice.
+    Counters are changed with atomic UPDATEs so concurrent requests do not
+    overwrite each other's increments.
+    """
+
+    @staticmethod
+    def new_rollup(user_id: int) -> UserStats:
+        """Create an empty rollup row."""
+        return UserStats(
+            user_id=user_id,
+            total_conversations=0,
+            total_practice_sessions=0,
+            practice_sessions_completed=0,
+            score_sum=0.0,
+            score_count=0,
+            topics_practiced=[],
+            recent_activity=[]
+        )
+
+    @staticmethod
+    def _new_topic_rollup(user_id: int, topic: str) -> UserTopicStats:
+        """Create an empty per-topic rollup row."""
+        return UserTopicStats(
+            user_id=user_id,
+            topic=topic,
+            attempts=0,
+            completions=0,
+            score_sum=0.0,
+            score_count=0
+        )
+
+    @staticmethod
+    def _timestamp(value: Optional[datetime] = None) -> str:
+        """Format a timestamp as ISO 8601, treating naive database values as UTC."""
+        value = value or datetime.now(timezone.utc)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+
+    @staticmethod
+    def _push_activity(stats: UserStats, event: dict) -> None:
+        """Prepend an event to the bounded recent-activity log."""
+        activity = [event] + list(stats.recent_activity or [])
+        stats.recent_activity = activity[:settings.recent_activity_limit]
+
+    @staticmethod
+    async def _compute(db: AsyncSession, stats: UserStats) -> UserStats:
+        """Recompute a rollup row and its topic rows from the source tables."""
+        user_id = stats.user_id
+
+        conv_result = await db.execute(
+            select(func.count(Conversation.id)).where(Conversation.user_id == user_id)
+        )
+        stats.total_conversations = conv_result.scalar() or 0
+
+        # Per-topic aggregates; the user totals are their sums
+        topic_result = await db.execute(
+            select(
+                PracticeSession.topic,
+                func.count(PracticeSession.id),
+                func.count(PracticeSession.is_correct),
+                func.coalesce(func.sum(PracticeSession.score), 0.0),
+                func.count(PracticeSession.score),
+                func.max(func.coalesce(PracticeSession.completed_at, PracticeSession.created_at))
+            )
+            .where(PracticeSession.user_id == user_id)
+            .group_by(PracticeSession.topic)
+            .order_by(func.min(PracticeSession.id))
+        )
+        topic_rows = topic_result.all()
+
+        await db.execute(delete(UserTopicStats).where(UserTopicStats.user_id == user_id))
+        for topic, attempts, completions, score_sum, score_count, last_practiced in topic_rows:
+            topic_stats = StatsService._new_topic_rollup(user_id, topic)
+            topic_stats.attempts = attempts
+            topic_stats.completions = completions
+            topic_stats.score_sum = float(score_sum)
+            topic_stats.score_count = score_count
+            topic_stats.last_practiced_at = last_practiced
+            db.add(topic_stats)
+
+        stats.total_practice_sessions = sum(row[1] for row in topic_rows)
+        stats.practice_sessions_completed = sum(row[2] for row in topic_rows)
+        stats.score_sum = float(sum(row[3] for row in topic_rows))
+        stats.score_count = sum(row[4] for row in topic_rows)
+        stats.topics_practiced = [row[0] for row in topic_rows]
+        stats.recent_activity = await StatsService._compute_activity(db, user_id)
+
+        return stats
+
+    @staticmethod
+    async def _compute_activity(db: AsyncSession, user_id: int) -> List[dict]:
+        """Rebuild the recent-activity log from the newest source rows."""
+        limit = settings.recent_activity_limit
+        events = []
+
+        conv_result = await db.execute(
+            select(Conversation.title, Conversation.created_at)
+            .where(Conversation.user_id == user_id)
+            .order_by(desc(Conversation.id))
+            .limit(limit)
+        )
+        for title, created_at in conv_result.all():
+            events.append({
+                "type": "conversation_started",
+                "title": title,
+                "timestamp": StatsService._timestamp(created_at)
+            })
+
+        practice_result = await db.execute(
+            select(PracticeSession)
+            .where(PracticeSession.user_id == user_id)
+            .order_by(desc(PracticeSession.id))
+            .limit(limit)
+        )
+        for session in practice_result.scalars().all():
+            events.append({
+                "type": "practice_started",
+                "topic": session.topic,
+                "difficulty": session.difficulty,
+                "timestamp": StatsService._timestamp(session.created_at)
+            })
+            if session.completed_at is not None:
+                events.append({
+                    "type": "practice_completed",
+                    "topic": session.topic,
+                    "score": session.score,
+                    "is_correct": session.is_correct,
+                    "timestamp": StatsService._timestamp(session.completed_at)
+                })
+
+        events.sort(key=lambda e: e["timestamp"], reverse=True)
+        return events[:limit]
+
+    @staticmethod
+    async def _ensure_rollup(db: AsyncSession, user_id: int) -> None:
+        """Create the user's rollup row if missing, built from the source tables."""
+        result = await db.execute(
+            conflict_insert(db, UserStats)
+            .values(
+                user_id=user_id,
+                total_conversations=0,
+                total_practice_sessions=0,
+                practice_sessions_completed=0,
+                score_sum=0.0,
+                score_count=0,
+                topics_practiced=[],
+                recent_activity=[]
+            )
+            .on_conflict_do_nothing(index_elements=["user_id"])
+        )
+        if result.rowcount:
+            # Only the request that created the row fills it in
+            stats = await db.get(UserStats, user_id, populate_existing=True)
+            await StatsService._compute(db, stats)
+            await db.flush()
+
+    @staticmethod
+    async def _update_rollup(db: AsyncSession, user_id: int, **values) -> UserStats:
+        """Apply counter changes to the user's rollup row and return it.
+
+        The row is reloaded after the UPDATE, which holds the write lock
+        until commit, so its JSON fields can be changed without losing
+        concurrent edits.
+        """
+        statement = update(UserStats).where(UserStats.user_id == user_id).values(**values)
+        result = await db.execute(statement)
+        if result.rowcount == 0:
+            await StatsService._ensure_rollup(db, user_id)
+            await db.execute(statement)
+        # Flush edits made earlier in this transaction before reloading over them
+        await db.flush()
+        return await db.get(UserStats, user_id, populate_existing=True)
+
+    @staticmethod
+    async def _update_topic_rollup(db: AsyncSession, user_id: int, topic: str, **values) -> None:
+        """Apply counter changes to the user's rollup row for a topic, creating it if missing."""
+        statement = (
+            update(UserTopicStats)
+            .where(UserTopicStats.user_id == user_id, UserTopicStats.topic == topic)
+            .values(**values)
+        )
+        result = await db.execute(statement)
+        if result.rowcount == 0:
+            await db.execute(
+                conflict_insert(db, UserTopicStats)
+                .values(user_id=user_id, topic=topic, attempts=0, completions=0, score_sum=0.0, score_count=0)
+                .on_conflict_do_nothing(index_elements=["user_id", "topic"])
+            )
+            await db.execute(statement)
+
+    @staticmethod
+    async def record_conversation_created(db: AsyncSession, user_id: int, title: Optional[str] = None) -> None:
+        """Count a new conversation."""
+        stats = await StatsService._update_rollup(
+            db, user_id, total_conversations=UserStats.total_conversations + 1
+        )
+        StatsService._push_activity(stats, {
+            "type": "conversation_started",
+            "title": title,
+            "timestamp": StatsService._timestamp()
+        })
+
+    @staticmethod
+    async def record_conversation_deleted(db: AsyncSession, user_id: int) -> None:
+        """Uncount a deleted conversation."""
+        await StatsService._update_rollup(
+            db,
+            user_id,
+            total_conversations=case(
+                (UserStats.total_conversations > 0, UserStats.total_conversations - 1),
+                else_=0
+            )
+        )
+
+    @staticmethod
+    async def record_practice_session_created(
+        db: AsyncSession,
+        user_id: int,
+        topic: str,
+        difficulty: Optional[str] = None
+    ) -> None:
+        """Count a new practice session."""
+        stats = await StatsService._update_rollup(
+            db, user_id, total_practice_sessions=UserStats.total_practice_sessions + 1
+        )
+        if topic not in (stats.topics_practiced or []):
+            stats.topics_practiced = (stats.topics_practiced or []) + [topic]
+        StatsService._push_activity(stats, {
+            "type": "practice_started",
+            "topic": topic,
+            "difficulty": difficulty,
+            "timestamp": StatsService._timestamp()
+        })
+
+        await StatsService._update_topic_rollup(
+            db,
+            user_id,
+            topic,
+            attempts=UserTopicStats.attempts + 1,
+            last_practiced_at=datetime.now(timezone.utc)
+        )
+
+    @staticmethod
+    async def record_practice_answer(
+        db: AsyncSession,
+        session: PracticeSession,
+        is_correct: bool,
+        score: Optional[float]
+    ) -> None:
+        """Count a graded answer, replacing the score of an earlier attempt."""
+        score_delta = (score or 0.0) - (session.score or 0.0)
+        count_delta = (score is not None) - (session.score is not None)
+        completed = 1 if session.is_correct is None else 0
+
+        stats = await StatsService._update_rollup(
+            db,
+            session.user_id,
+            score_sum=UserStats.score_sum + score_delta,
+            score_count=UserStats.score_count + count_delta,
+            practice_sessions_completed=UserStats.practice_sessions_completed + completed
+        )
+        await StatsService._update_topic_rollup(
+            db,
+            session.user_id,
+            session.topic,
+            score_sum=UserTopicStats.score_sum + score_delta,
+            score_count=UserTopicStats.score_count + count_delta,
+            completions=UserTopicStats.completions + completed,
+            last_practiced_at=datetime.now(timezone.utc)
+        )
+
+        StatsService._push_activity(stats, {
+            "type": "practice_completed",
+            "topic": session.topic,
+            "score": score,
+            "is_correct": is_correct,
+            "timestamp": StatsService._timestamp()
+        })
+
+    @staticmethod
+    async def get_user_stats(db: AsyncSession, user_id: int) -> dict:
+        """Get user learning statistics from the rollups.
+        
+        db may be a read-only session; a missing rollup is built on a
+        separate write session.
+        """
+        stats = await db.get(UserStats, user_id)
+        if stats is None:
+            async with sessionmanager.session() as write_db:
+                await StatsService._ensure_rollup(write_db, user_id)
+            stats = await db.get(UserStats, user_id)
+
+        result = await db.execute(
+            select(UserTopicStats).where(UserTopicStats.user_id == user_id)
+        )
+        progress_by_topic = {
+            t.topic: {
+                "attempts": t.attempts,
+                "completed": t.completions,
+                "average_score": round(t.score_sum / t.score_count, 2) if t.score_count else 0.0,
+                "last_practiced_at": StatsService._timestamp(t.last_practiced_at) if t.last_practiced_at else None
+            }
+            for t in result.scalars().all()
+        }
+
+        avg_score = stats.score_sum / stats.score_count if stats.score_count else 0.0
+
+        return {
+            "total_conversations": stats.total_conversations,
+            "total_practice_sessions": stats.total_practice_sessions,
+            "practice_sessions_completed": stats.practice_sessions_completed,
+            "average_score": round(avg_score, 2),
+            "topics_practiced": list(stats.topics_practiced or []),
+            "recent_activity": list(stats.recent_activity or []),
+            "progress_by_topic": progress_by_topic
+        }
+
+    @staticmethod
+    async def rebuild(db: AsyncSession, user_id: Optional[int] = None) -> int:
+        """Recompute rollups from source tables to repair drift.
+
+        Rebuilds a single user when user_id is given, otherwise every user.
+        Returns the number of users rebuilt.
+        """
+        query = select(User.id).order_by(User.id)
+        if user_id is not None:
+            query = query.where(User.id == user_id)
+        user_ids = (await db.execute(query)).scalars().all()
+
+        for index, uid in enumerate(user_ids, start=1):
+            stats = await db.get(UserStats, uid)
+            if stats is None:
+                stats = StatsService.new_rollup(uid)
+                db.add(stats)
+            await StatsService._compute(db, stats)
+
+            if index % 500 == 0:
+                await db.commit()
+                logger.info(f"Rebuilt stats for {index} users")
+
+        await db.commit()
+        return len(user_ids)
@@ -0,0 +1,59 @@
+"""LLM usage reporting service."""
+from datetime import timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+
+from ..llm.client import get_llm_client
+from ..llm.usage import utc_today
+from ..models.db_models import LLMUsage
+from ..models.schemas import UsageEntry, UsageResponse
+
+logger = logging.getLogger(__name__)
+
+
+class UsageService:
+    """Reads the per-user LLM usage ledger."""
+
+    @staticmethod
+    async def get_usage(db: AsyncSession, user_id: int, days: int) -> UsageResponse:
+        """Get a user's usage for the last days, including counters not yet flushed."""
+        ledger = get_llm_client().usage
+        since = utc_today() - timedelta(days=days - 1)
+
+        result = await db.execute(
+            select(LLMUsage)
+            .where(LLMUsage.user_id == user_id, LLMUsage.day >= since)
+        )
+        totals = {
+            (row.day, row.call_site): [row.calls, row.prompt_tokens, row.completion_tokens]
+            for row in result.scalars()
+        }
+        for (_, day, call_site), counters in (ledger.pending(user_id) if ledger else {}).items():
+            if day >= since:
+                row = totals.setdefault((day, call_site), [0, 0, 0])
+                for i, value in enumerate(counters):
+                    row[i] += value
+
+        usage = [
+            UsageEntry(
+                day=day,
+                call_site=call_site,
+                calls=calls,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens
+            )
+            for (day, call_site), (calls, prompt_tokens, completion_tokens) in sorted(
+                totals.items(), key=lambda item: (item[0][0], item[0][1]), reverse=True
+            )
+        ]
+        today = utc_today()
+        used_today = sum(e.prompt_tokens + e.completion_tokens for e in usage if e.day == today)
+        quota = ledger.daily_quota if ledger and ledger.daily_quota else None
+
+        return UsageResponse(
+            used_today=used_today,
+            daily_quota=quota,
+            remaining_today=max(quota - used_today, 0) if quota else None,
+            usage=usage
+        )
@@ -0,0 +1,263 @@
+"""Bulk user import service."""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import IO, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+import asyncio
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import sessionmanager
+from ..models.db_models import User
+from ..models.schemas import UserImportResult, UserImportSummary, UserRegister
+from .auth_service import AuthService
+from .stats_service import StatsService
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+Row = Tuple[int, Optional[dict]]
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash a batch of passwords; runs in a hash pool process."""
+    return [AuthService.hash_password(password) for password in passwords]
+
+
+def _hash_workers() -> int:
+    return settings.bulk_import_hash_workers or os.cpu_count() or 1
+
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        # Spawn rather than fork: the server process runs an event loop and threads
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=_hash_workers(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _hash_pool
+
+def close_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+class UserImportService:
+    """Creates users in bulk from CSV or NDJSON uploads.
+
+    Rows are handled in chunks: one query finds the usernames and emails
+    already taken, passwords are hashed in parallel on a process pool and
+    the new users are inserted with one multi-row statement. Each chunk is
+    committed on its own, so the report lines already sent stay true if a
+    later chunk fails.
+    """
+
+    @staticmethod
+    async def spool(stream: AsyncIterator[bytes]) -> IO[bytes]:
+        """Copy an upload to a temporary file, ready to read from the start."""
+        upload = tempfile.TemporaryFile()
+        async for data in stream:
+            upload.write(data)
+        upload.seek(0)
+        return upload
+
+    @staticmethod
+    def read_rows(upload: IO[bytes], format: str) -> Iterator[Row]:
+        """Yield (row number, fields) pairs; fields is None for unreadable rows."""
+        text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+        if format == "csv":
+            for row, values in enumerate(csv.DictReader(text), 1):
+                yield row, {key: value or None for key, value in values.items() if key}
+            return
+
+        row = 0
+        for line in text:
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                values = json.loads(line)
+            except json.JSONDecodeError:
+                values = None
+            yield row, values if isinstance(values, dict) else None
+
+    @staticmethod
+    async def import_users(upload: IO[bytes], format: str, admin: str) -> AsyncIterator[str]:
+        """Import the upload, yielding an NDJSON report line per row and a summary."""
+        summary = UserImportSummary()
+        seen_usernames: Set[str] = set()
+        seen_emails: Set[str] = set()
+        rows = UserImportService.read_rows(upload, format)
+
+        try:
+            while True:
+                chunk = list(islice(rows, settings.bulk_import_chunk_size))
+                if not chunk:
+                    break
+
+                results = await UserImportService._import_chunk(chunk, seen_usernames, seen_emails)
+                for result in results:
+                    setattr(summary, result.status, getattr(summary, result.status) + 1)
+                    yield json.dumps(result.model_dump(exclude_none=True)) + "\n"
+        finally:
+            upload.close()
+
+        logger.info(
+            f"Bulk import by {admin}: {summary.created} created, "
+            f"{summary.exists} existing, {summary.invalid} invalid"
+        )
+        yield json.dumps({"summary": summary.model_dump()}) + "\n"
+
+    @staticmethod
+    async def _import_chunk(
+        chunk: List[Row],
+        seen_usernames: Set[str],
+        seen_emails: Set[str]
+    ) -> List[UserImportResult]:
+        results: Dict[int, UserImportResult] = {}
+        candidates: List[Tuple[int, UserRegister]] = []
+
+        for row, values in chunk:
+            if values is None:
+                results[row] = UserImportResult(row=row, status="invalid", error="Unreadable row")
+                continue
+            try:
+                candidates.append((row, UserRegister.model_validate(values)))
+            except ValidationError as e:
+                username = values.get("username")
+                results[row] = UserImportResult(
+                    row=row,
+                    status="invalid",
+                    username=username if isinstance(username, str) else None,
+                    error=_describe(e)
+                )
+
+        async with sessionmanager.session() as db:
+            taken_usernames, taken_emails = await UserImportService._taken(db, candidates)
+
+        new_users = []
+        for row, user in candidates:
+            if user.username in taken_usernames or user.username in seen_usernames:
+                error = "Username already exists"
+            elif user.email in taken_emails or user.email in seen_emails:
+                error = "Email already exists"
+            else:
+                seen_usernames.add(user.username)
+                seen_emails.add(user.email)
+                new_users.append((row, user))
+                continue
+            results[row] = UserImportResult(row=row, status="exists", username=user.username, error=error)
+
+        if new_users:
+            hashes = await UserImportService._hash([user.password for _, user in new_users])
+            ids = await UserImportService._insert(new_users, hashes, results)
+            for row, user in new_users:
+                if row not in results:
+                    results[row] = UserImportResult(
+                        row=row, status="created", username=user.username, id=ids[user.username]
+                    )
+
+        return [results[row] for row, _ in chunk]
+
+    @staticmethod
+    async def _taken(db: AsyncSession, users: List[Tuple[int, UserRegister]]) -> Tuple[Set[str], Set[str]]:
+        """Usernames and emails among users that already belong to someone."""
+        if not users:
+            return set(), set()
+
+        usernames = {user.username for _, user in users}
+        emails = {user.email for _, user in users}
+        result = await db.execute(
+            select(User.username, User.email)
+            .where(or_(User.username.in_(usernames), User.email.in_(emails)))
+        )
+        rows = result.all()
+        return {row.username for row in rows}, {row.email for row in rows}
+
+    @staticmethod
+    async def _hash(passwords: List[str]) -> List[str]:
+        """Hash passwords in parallel, one batch per hash pool process."""
+        loop = asyncio.get_running_loop()
+        pool = get_hash_pool()
+        size = -(-len(passwords) // _hash_workers())
+        batches = await asyncio.gather(*(
+            loop.run_in_executor(pool, _hash_passwords, passwords[i:i + size])
+            for i in range(0, len(passwords), size)
+        ))
+        return [hashed for batch in batches for hashed in batch]
+
+    @staticmethod
+    async def _insert(
+        users: List[Tuple[int, UserRegister]],
+        hashes: List[str],
+        results: Dict[int, UserImportResult]
+    ) -> Dict[str, int]:
+        """Insert users and their stats rollups; returns ids by username.
+
+        Users registered by someone else since the collision check are
+        reported as existing and the rest are inserted again.
+        """
+        pending = list(zip(users, hashes))
+        for attempt in range(2):
+            async with sessionmanager.session() as db:
+                try:
+                    result = await db.execute(
+                        insert(User).returning(User.id, User.username),
+                        [
+                            {
+                                "username": user.username,
+                                "email": user.email,
+                                "full_name": user.full_name,
+                                "hashed_password": hashed,
+                                "learning_goals": user.learning_goals,
+                                "preferred_topics": [],
+                                "is_active": True
+                            }
+                            for (_, user), hashed in pending
+                        ]
+                    )
+                    ids = {username: user_id for user_id, username in result.all()}
+                    db.add_all([StatsService.new_rollup(user_id) for user_id in ids.values()])
+                    await db.commit()
+                    return ids
+                except IntegrityError:
+                    if attempt:
+                        raise
+                    await db.rollback()
+                    taken_usernames, taken_emails = await UserImportService._taken(
+                        db, [user for user, _ in pending]
+                    )
+
+            remaining = []
+            for (row, user), hashed in pending:
+                if user.username in taken_usernames or user.email in taken_emails:
+                    error = "Username already exists" if user.username in taken_usernames else "Email already exists"
+                    results[row] = UserImportResult(row=row, status="exists", username=user.username, error=error)
+                else:
+                    remaining.append(((row, user), hashed))
+            pending = remaining
+            if not pending:
+                return {}
+        return {}
@@ -6,6 +6,7 @@ import logging
 
 from ..models.db_models import User
 from ..models.schemas import UserUpdate
+from .auth_service import get_principal_cache
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +32,18 @@ class UserService:
             user.preferred_topics = update_data.preferred_topics
         
         await db.commit()
+        get_principal_cache().invalidate(user.username)
         await db.refresh(user)
         
         logger.info(f"User updated: {user.username}")
         return user
+    
+    @staticmethod
+    async def set_active(db: AsyncSession, user: User, is_active: bool) -> User:
+        """Activate or deactivate a user; deactivated users are signed out."""
+        user.is_active = is_active
+        await db.commit()
+        get_principal_cache().invalidate(user.username)
+        
+        logger.info(f"User {'activated' if is_active else 'deactivated'}: {user.username}")
+        return user
@@ -1,8 +1,10 @@
 """Utility functions."""
+import base64
+import json
 import re
 import secrets
 import string
-from typing import Optional
+from typing import List, Optional
 
 
 def generate_random_string(length: int = 32) -> str:
@@ -23,6 +25,72 @@ def truncate_string(text: str, max_length: int = 100, suffix: str = "...") -> st
     return text[:max_length - len(suffix)] + suffix
 
 
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimate the number of LLM tokens in a string (~4 characters per token)."""
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+def fit_to_token_budget(messages: List[dict], budget: int) -> List[dict]:
+    """Keep system messages plus the newest chat messages that fit in the budget."""
+    system = [m for m in messages if m.get('role') == 'system']
+    used = sum(estimate_tokens(m.get('content')) for m in system)
+    
+    kept = []
+    for msg in reversed([m for m in messages if m.get('role') != 'system']):
+        tokens = estimate_tokens(msg.get('content'))
+        if used + tokens > budget:
+            break
+        kept.append(msg)
+        used += tokens
+    
+    return system + list(reversed(kept))
+
+
+def truncate_to_tokens(text: Optional[str], max_tokens: int, suffix: str = "...") -> str:
+    """Shorten text to roughly max_tokens tokens."""
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text or ""
+    return truncate_string(text, max(max_tokens * 4, len(suffix) + 1), suffix)
+
+
+def fit_prompt(messages: List[dict], budget: int) -> List[dict]:
+    """Fit a whole prompt into a token budget.
+
+    The oldest chat turns are dropped first; if that is not enough, the
+    longest remaining messages are shortened. The last message is kept.
+    """
+    total = sum(estimate_tokens(m.get('content')) for m in messages)
+    if total <= budget:
+        return messages
+
+    fitted = list(messages)
+    i = 0
+    while total > budget and i < len(fitted) - 1:
+        if fitted[i].get('role') == 'system':
+            i += 1
+            continue
+        total -= estimate_tokens(fitted.pop(i).get('content'))
+
+    while total > budget:
+        longest = max(range(len(fitted)), key=lambda j: estimate_tokens(fitted[j].get('content')))
+        tokens = estimate_tokens(fitted[longest].get('content'))
+        target = max(tokens - (total - budget), 16)
+        if target >= tokens:
+            break
+        content = truncate_to_tokens(fitted[longest].get('content'), target)
+        fitted[longest] = {**fitted[longest], "content": content}
+        total += estimate_tokens(content) - tokens
+
+    return fitted
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a topic for grouping: lowercase with single spaces."""
+    return " ".join(topic.lower().split())
+
+
 def format_error_message(error: Exception) -> str:
     """Format an error message for display."""
     return f"{type(error).__name__}: {str(error)}"
@@ -33,3 +101,26 @@ def parse_topics(topics_str: Optional[str]) -> list:
     if not topics_str:
         return []
     return [topic.strip() for topic in topics_str.split(',') if topic.strip()]
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def encode_cursor(*parts) -> str:
+    """Encode values into an opaque pagination cursor."""
+    raw = "|".join(str(part) for part in parts)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, size: int) -> List[str]:
+    """Decode a pagination cursor, raising ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    except Exception:
+        raise ValueError("Invalid cursor")
+    parts = raw.rsplit("|", size - 1)
+    if len(parts) != size:
+        raise ValueError("Invalid cursor")
+    return parts